@@ -0,0 +1,117 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import pygame  # Need this for pygame.image.load()
+    import os  # Need this for os.path.normpath()
+    import sys
+    from collections import OrderedDict
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class AssetCache:
+    """
+    Registry that loads every image once and shares the surface between its users
+
+    Images are converted to the display's pixel format if there is a display.
+    Images are reference counted. When the last user releases an image it is not
+    freed right away but kept in a small LRU pool, so a level that is rebuilt
+    or swapped back in does not have to decode its images again.
+    """
+    def __init__(self, max_unused=16):
+        self.images = {}                 # { path: surface } for every loaded image
+        self.references = {}             # { path: number of users }
+        self.unused = OrderedDict()      # Paths with no users, least recently released first
+        self.max_unused = max_unused     # How many unused images are kept before eviction
+
+    @staticmethod
+    def normalize(image_dir):
+        """Returns the key under which an image is stored"""
+        return os.path.normpath(image_dir)
+
+    def acquire(self, image_dir):
+        """Returns a shared surface for an image, loading it if needed
+
+        Every call to acquire() should be paired with a call to release()
+
+        Args:
+            image_dir: path to the image
+
+        Returns:
+            A pygame Surface with the image
+        """
+        key = self.normalize(image_dir)
+        if key not in self.images:  # Decode the image only once
+            self.store(key, self.decode(key))
+        if key in self.unused:  # Image is in use again
+            del self.unused[key]
+        self.references[key] += 1
+        return self.images[key]
+
+    @staticmethod
+    def decode(image_dir):
+        """Decodes an image without adding it to the cache, safe to call from a worker thread"""
+        return pygame.image.load(AssetCache.normalize(image_dir))
+
+    def store(self, image_dir, image):
+        """Adds an image decoded with decode() to the cache, unused until it is acquired
+
+        Must be called from the main thread, since converting needs the video mode
+        """
+        key = self.normalize(image_dir)
+        if key in self.images:
+            return
+        if pygame.display.get_surface() is not None:  # Converting needs a video mode,
+            image = image.convert_alpha()            # headless games use images as they are
+        self.images[key] = image
+        self.references[key] = 0
+        self.unused[key] = True
+        self.evict(self.max_unused)
+
+    def release(self, image_dir):
+        """Releases an image acquired earlier
+
+        Raises:
+            KeyError: If the image was never acquired
+        """
+        key = self.normalize(image_dir)
+        if self.references.get(key, 0) <= 0:
+            raise KeyError("(!) Error: releasing an image that is not in use: {}".format(key))
+        self.references[key] -= 1
+        if self.references[key] == 0:  # Keep the image around in case it is needed again
+            self.unused[key] = True
+            self.evict(self.max_unused)
+
+    def evict(self, keep=0):
+        """Frees unused images, keeping at most 'keep' of the most recently released ones"""
+        while len(self.unused) > keep:
+            key, _ = self.unused.popitem(last=False)
+            del self.images[key]
+            del self.references[key]
+
+    def get_memory_usage(self):
+        """Returns the approximate amount of memory taken by loaded images in bytes"""
+        return sum(image.get_width() * image.get_height() * image.get_bytesize()
+                   for image in self.images.values())
+
+
+asset_cache = AssetCache()  # Cache shared by everything in the game
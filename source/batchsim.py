@@ -0,0 +1,285 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import argparse
+    import csv
+    import math  # Need this for math.sin()
+    import multiprocessing
+    import os  # Need this for os.environ
+    import random
+    import time  # Need this for time.perf_counter()
+    import sys
+    from benchmark import DEFAULT_SCRIPT, script_actions
+    from level import Level
+    from player import Player
+    from snapshot import capture, restore
+    from utils import angle_difference
+    from world import World
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+DIRECTION_ANGLES = {'up': 0, 'right': 90, 'down': 180, 'left': 270}  # Movement angle for every direction
+RESULT_FIELDS = ['episode', 'seed', 'policy', 'completed', 'completion_time', 'collisions',
+                 'frames', 'steps', 'wall_time', 'steps_per_second']
+forked_runs = {}  # { (maze, seed, physics_step, warmup): (level, world, player, collisions, snapshot) } per process
+
+
+def make_episodes(count, seed=0, maze=None, policy='script', frames=6000, time_delta=1/75.0,
+                  physics_step=1/150.0, fork=None):
+    """Returns configurations of episodes that differ only by their seed
+
+    The seed generates the maze of an episode. On the test level, and in forked
+    episodes, it picks the goal junction instead.
+
+    Args:
+        count: number of episodes
+        seed: seed of the first episode, the following episodes use the next seeds
+        maze: (width, height) of a generated maze in junctions, None for the test level
+        policy: 'script' to drive with DEFAULT_SCRIPT, 'route' to follow the shortest route to the goal
+        frames: most frames an episode lasts
+        time_delta: seconds that pass every frame
+        physics_step: fixed physics step in seconds, None to step twice per frame
+        fork: frames of warm-up shared by all episodes, None to build a new world for every episode.
+            Forked episodes all start from a snapshot of the same warmed-up world (the maze of
+            the first seed) and drive to a goal junction picked by their seed
+
+    Returns:
+        A list of dictionaries accepted by run_episode()
+    """
+    return [{'episode': episode, 'seed': seed + episode, 'maze': maze, 'policy': policy, 'frames': frames,
+             'time_delta': time_delta, 'physics_step': physics_step, 'fork': fork,
+             'base_seed': seed} for episode in range(count)]
+
+
+def get_direction(grid_x, grid_y, target_x, target_y):
+    """Returns the direction from a grid cell to another one on the same row or column"""
+    if target_x != grid_x:
+        return 'right' if target_x > grid_x else 'left'
+    return 'down' if target_y > grid_y else 'up'
+
+
+def follow_route(player, router, goal, braking=300.0):
+    """Route policy: drives along the shortest route to the goal
+
+    The car accelerates towards the next junction on the route. If the route turns
+    there, the car slows down so that braking at braking px/s^2 stops it in the middle
+    of the junction, and turns once it gets there. It waits for the car to face the
+    new direction before accelerating again.
+    """
+    world_x, world_y = player.car.get_position()
+    path, _ = router.find_route_from(world_x, world_y, goal)
+    if not path:
+        return  # Lost, or the goal cannot be reached
+    level = router.level
+    grid_x, grid_y = level.world_to_grid(world_x, world_y)
+    if (path[0].x, path[0].y) != (grid_x, grid_y):  # In a tunnel, head to the junction the route starts at
+        heading = DIRECTION_ANGLES[get_direction(grid_x, grid_y, path[0].x, path[0].y)]
+        if angle_difference(player.movement_angle, heading):
+            player.change_movement_direction(player.movement_angle + angle_difference(player.movement_angle,
+                                                                                      heading))
+    if abs(angle_difference(player.get_car_angle(), player.movement_angle)) > 30:
+        return  # Let the alignment spring turn the car first, thrust would push it sideways into a tunnel
+    if len(path) < 2:
+        player.accelerate()
+        return
+    target, after = path[0], path[1]
+    turn = angle_difference(player.movement_angle,
+                            DIRECTION_ANGLES[get_direction(target.x, target.y, after.x, after.y)])
+    if not turn:
+        player.accelerate()
+        return
+    center_x = (target.x + 0.5) * level.grid_size
+    center_y = (target.y + 0.5) * level.grid_size
+    angle = math.radians(player.movement_angle)
+    forward_x, forward_y = math.sin(angle), -math.cos(angle)  # Angle 0 is up
+    ahead = (center_x - world_x) * forward_x + (center_y - world_y) * forward_y
+    if abs(ahead) < level.grid_size / 8:
+        player.change_movement_direction(player.movement_angle + turn)
+        return
+    velocity = player.car.body.velocity
+    stopping_speed = math.copysign(math.sqrt(2 * braking * abs(ahead)), ahead)
+    if velocity.x * forward_x + velocity.y * forward_y < stopping_speed:
+        player.accelerate()
+    else:
+        player.decelerate()
+
+
+def build_episode(maze, seed, physics_step):
+    """Builds the level, the world and the player of an episode
+
+    Returns:
+        level, world, player, collisions: collisions[0] counts collisions of the world's bodies
+    """
+    level = Level()
+    if maze is None:
+        level.generate_test_level()
+    else:
+        level.generate_maze(maze[0], maze[1], seed=seed)
+    world = World(physics_step=physics_step, level=level)  # One pymunk.Space per episode
+    world.build_from_level()
+    player = Player()
+    player.place_in_world(world)
+    collisions = [0]
+
+    def count_collision(arbiter, space, data):
+        collisions[0] += 1
+        return True  # Collide as usual
+
+    world.physics.space.add_default_collision_handler().begin = count_collision
+    return level, world, player, collisions
+
+
+def get_forked_run(config):
+    """Returns the world of a forked episode, restored to the warmed-up snapshot
+
+    The world is built and warmed up once per process, by letting the car settle for
+    config['fork'] frames. Every later episode only restores the snapshot.
+
+    Returns:
+        level, world, player, collisions: like build_episode()
+    """
+    key = (config['maze'] and tuple(config['maze']), config['base_seed'], config['physics_step'], config['fork'])
+    if key not in forked_runs:
+        level, world, player, collisions = build_episode(config['maze'], config['base_seed'],
+                                                         config['physics_step'])
+        for _ in range(config['fork']):
+            world.update(config['time_delta'])
+        forked_runs[key] = (level, world, player, collisions, capture(world, player))
+    level, world, player, collisions, snapshot = forked_runs[key]
+    restore(snapshot, world, player)
+    collisions[0] = 0
+    return level, world, player, collisions
+
+
+def run_episode(config):
+    """Simulates one headless episode: a world, a player and scripted input, nothing is drawn
+
+    The episode ends when the player's car reaches the goal, or after config['frames']
+    frames. In a generated maze the goal is the junction farthest from the entry point
+    along the level. On the test level and in forked episodes, the seed picks a random
+    goal junction other than the entry point, since the level is the same for every seed.
+
+    Args:
+        config: dictionary from make_episodes()
+
+    Returns:
+        A dictionary with the results, see RESULT_FIELDS
+    """
+    start = time.perf_counter()
+    if config.get('fork') is None:
+        level, world, player, collisions = build_episode(config['maze'], config['seed'], config['physics_step'])
+    else:
+        level, world, player, collisions = get_forked_run(config)
+    entry = level.entry_point
+    if config['maze'] is None or config.get('fork') is not None:
+        goal = random.Random(config['seed']).choice([junction for junction in level.junctions
+                                                     if junction != entry])
+    else:
+        goal = max(level.junctions, key=lambda junction: abs(junction.x - entry.x) + abs(junction.y - entry.y))
+    first_step = world.physics.step_count
+    completion_time = None
+    frame = 0
+    while frame < config['frames']:
+        if config['policy'] == 'route':
+            follow_route(player, world.router, goal)
+        else:
+            for action in script_actions(DEFAULT_SCRIPT, frame):
+                getattr(player, action)()
+        world.update(config['time_delta'])
+        frame += 1
+        if level.world_to_grid(*player.car.get_position()) == (goal.x, goal.y):
+            completion_time = frame * config['time_delta']
+            break
+    wall_time = time.perf_counter() - start
+    steps = world.physics.step_count - first_step
+    return {
+        'episode': config['episode'],
+        'seed': config['seed'],
+        'policy': config['policy'],
+        'completed': completion_time is not None,
+        'completion_time': completion_time,
+        'collisions': collisions[0],
+        'frames': frame,
+        'steps': steps,
+        'wall_time': wall_time,
+        'steps_per_second': steps / wall_time if wall_time else 0.0,
+    }
+
+
+def init_worker():
+    """Prepares a worker process, nothing is ever displayed"""
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+
+def run_batch(episodes, processes=None):
+    """Runs episodes in a pool of processes
+
+    Episodes are independent, so the pool scales with the number of cores.
+    Results are yielded as soon as episodes finish, in no particular order.
+
+    Args:
+        episodes: configurations from make_episodes()
+        processes: number of worker processes, None for one per core
+
+    Yields:
+        Result dictionaries from run_episode()
+    """
+    with multiprocessing.Pool(processes, initializer=init_worker) as pool:
+        for result in pool.imap_unordered(run_episode, episodes):
+            yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs many headless episodes in parallel")
+    parser.add_argument('--episodes', type=int, default=32, help="number of episodes")
+    parser.add_argument('--processes', type=int, help="number of worker processes (default: one per core)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first episode")
+    parser.add_argument('--maze', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="drive through generated mazes of this many junctions instead of the test level")
+    parser.add_argument('--policy', choices=('script', 'route'), default='script', help="how the car is driven")
+    parser.add_argument('--frames', type=int, default=6000, help="most frames an episode lasts")
+    parser.add_argument('--fps', type=float, default=75, help="simulated frame rate")
+    parser.add_argument('--fork', type=int, metavar='FRAMES',
+                        help="warm up one world for this many frames and start every episode from a snapshot of it")
+    parser.add_argument('--csv', help="file to write the results of every episode to")
+    args = parser.parse_args()
+    episodes = make_episodes(args.episodes, seed=args.seed, maze=args.maze, policy=args.policy,
+                             frames=args.frames, time_delta=1.0 / args.fps, fork=args.fork)
+    results = []
+    start = time.perf_counter()
+    for result in run_batch(episodes, args.processes):
+        results.append(result)
+        print("(+) Episode {episode} (seed {seed}): {frames} frames, {collisions} collisions, "
+              "{steps_per_second:.0f} steps/s".format(**result) +
+              (", completed in {:.2f} s".format(result['completion_time']) if result['completed'] else ""))
+    elapsed = time.perf_counter() - start
+    print("(+) {} episodes in {:.2f} s ({:.0f} steps/s in total), {} completed".format(
+        len(results), elapsed, sum(result['steps'] for result in results) / elapsed,
+        sum(result['completed'] for result in results)))
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(sorted(results, key=lambda result: result['episode']))
+
+if __name__ == '__main__': main()
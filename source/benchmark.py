@@ -0,0 +1,157 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import argparse
+    import time  # Need this for time.perf_counter()
+    import sys
+    from game import Game
+    from level import Level
+    from levelfile import load_level
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+# Scripted drive through the test level, repeated until the benchmark ends
+# Each element is (number of frames, player methods called every one of those frames)
+DEFAULT_SCRIPT = [
+    (120, ['accelerate']),
+    (30, ['accelerate', 'steer_left']),
+    (30, ['accelerate', 'steer_right']),
+    (60, []),
+    (1, ['turn_right']),
+    (90, ['accelerate']),
+    (60, ['decelerate']),
+    (1, ['turn_left']),
+    (90, ['accelerate']),
+    (60, ['decelerate']),
+]
+
+
+def script_actions(script, frame):
+    """Returns the player methods that the script calls on a particular frame"""
+    frame %= sum(frames for frames, _ in script)
+    for frames, actions in script:
+        if frame < frames:
+            return actions
+        frame -= frames
+    return []
+
+
+def run(frames=3000, time_delta=1/75.0, render=True, script=DEFAULT_SCRIPT, physics_step=1/150.0, level=None,
+        fleet=0, stream_radius=None, stream_chunk_cells=4):
+    """Runs a headless game with scripted input and measures how long it takes
+
+    Args:
+        frames: number of frames to simulate
+        time_delta: seconds that pass every frame
+        render: draw every frame (into memory), physics only if False
+        script: scripted input, see DEFAULT_SCRIPT
+        physics_step: fixed physics step in seconds, None to step once per frame
+        level: Level to drive through, None for the test level
+        fleet: number of AI cars driving around the level
+        stream_radius: grid cells around cars that have walls, None to add all walls
+        stream_chunk_cells: walls are streamed in chunks of this many cells
+
+    Returns:
+        A dictionary with the results
+    """
+    game = Game(physics_step=physics_step, headless=True, level=level, stream_radius=stream_radius,
+                stream_chunk_cells=stream_chunk_cells)
+    game.init_pygame()
+    if render:
+        game.create_window()
+    load_start = time.perf_counter()
+    game.init()
+    game.world.fleet.spawn_in_level(fleet, seed=0)
+    load_time = time.perf_counter() - load_start
+    physics_time = 0.0
+    render_time = 0.0
+    for frame in range(frames):
+        for action in script_actions(script, frame):  # Drive the car
+            getattr(game.player, action)()
+        start = time.perf_counter()
+        game.world.update(time_delta)
+        physics_time += time.perf_counter() - start
+        if render:
+            start = time.perf_counter()
+            game.window.camera.update(time_delta)
+            game.render()
+            render_time += time.perf_counter() - start
+    steps = game.world.physics.step_count
+    total_time = physics_time + render_time
+    return {
+        'frames': frames,
+        'steps': steps,
+        'load_time': load_time,
+        'physics_time': physics_time,
+        'fleet_time': game.world.fleet.update_time,
+        'cars': game.world.fleet.count,
+        'render_time': render_time,
+        'steps_per_second': steps / physics_time if physics_time else 0.0,
+        'frames_per_second': frames / total_time if total_time else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark of the game loop")
+    parser.add_argument('--frames', type=int, default=3000, help="number of frames to simulate")
+    parser.add_argument('--fps', type=float, default=75, help="simulated frame rate")
+    parser.add_argument('--no-render', action='store_true', help="only run the physics")
+    parser.add_argument('--physics-step', type=float, default=1/150.0,
+                        help="fixed physics step in seconds, 0 to step once per frame")
+    parser.add_argument('--maze', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="drive through a generated maze of this many junctions instead of the test level")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated maze")
+    parser.add_argument('--level', help="drive through a level file instead of the test level")
+    parser.add_argument('--fleet', type=int, default=0, help="number of AI cars driving around the level")
+    parser.add_argument('--stream-radius', type=int, metavar='CELLS',
+                        help="only keep walls within this many grid cells of a car in the physical simulation")
+    parser.add_argument('--stream-chunk-cells', type=int, default=4, metavar='CELLS',
+                        help="stream walls in square chunks of this many grid cells")
+    args = parser.parse_args()
+    level = None
+    if args.level:
+        start = time.perf_counter()
+        level = load_level(args.level)
+        print("(+) Loaded {} junctions in {:.3f} s".format(len(level.junctions), time.perf_counter() - start))
+    elif args.maze:
+        level = Level()
+        generation_time = level.generate_maze(args.maze[0], args.maze[1], seed=args.seed)
+        print("(+) Generated a maze of {} junctions in {:.3f} s".format(len(level.junctions), generation_time))
+    results = run(frames=args.frames,
+                  time_delta=1.0 / args.fps,
+                  render=not args.no_render,
+                  physics_step=args.physics_step or None,
+                  level=level,
+                  fleet=args.fleet,
+                  stream_radius=args.stream_radius,
+                  stream_chunk_cells=args.stream_chunk_cells)
+    print("(+) Simulated {frames} frames ({steps} physics steps)".format(**results))
+    print("    Level load:   {:8.3f} s".format(results['load_time']))
+    print("    Physics time: {:8.3f} s ({:.0f} steps/s)".format(results['physics_time'],
+                                                                  results['steps_per_second']))
+    if results['cars']:
+        print("    of which AI:  {:8.3f} s ({:.2f} us per car per frame)".format(
+            results['fleet_time'], results['fleet_time'] / results['frames'] / results['cars'] * 1e6))
+    print("    Render time:  {:8.3f} s".format(results['render_time']))
+    print("    Frame rate:   {:8.1f} fps".format(results['frames_per_second']))
+
+if __name__ == '__main__': main()
@@ -20,6 +20,8 @@
 
 try:
     import pymunk  # Need this for Vec2d
+    import math  # Need this for math.radians()
+    import numpy
     import sys
 except ImportError as exc:
     print("(!) Could not load module {}, exiting...".format(exc))
@@ -39,6 +41,9 @@ class Camera:
         self.rotation_speed = 90  # Degrees per second
         self.collidable_to_follow = None  # Collidable that the camera is following
         self.player_to_follow = None  # Player that the camera is following
+        self.margin = 600  # Distance in pixels, any object that is further from the viewport will be ignored
+        self.matrix = numpy.identity(2)  # Rotation matrix for self.angle, used by batch conversions
+        self.matrix_angle = 0            # Angle that self.matrix was calculated for
 
     def world_to_viewport(self, world_coordinates):
         """Converts world coordinates to viewport coordinates"""
@@ -50,6 +55,37 @@ class Camera:
         vec.y += self.view_height / 2
         return int(vec.x), int(vec.y)
 
+    def get_rotation_matrix(self):
+        """Returns the matrix that rotates world offsets into the viewport, recalculated only on rotation"""
+        if self.matrix_angle != self.angle:
+            radians = math.radians(self.angle)
+            cos = math.cos(radians)
+            sin = math.sin(radians)
+            # Transposed rotation by -angle, so that row vectors can be multiplied by it
+            self.matrix = numpy.array([[cos, -sin],
+                                       [sin, cos]])
+            self.matrix_angle = self.angle
+        return self.matrix
+
+    def world_to_viewport_batch(self, positions):
+        """Converts many world coordinates to viewport coordinates at once
+
+        Args:
+            positions: array-like of shape (N, 2) with world coordinates
+
+        Returns:
+            coordinates, visible: an integer array (N, 2) of viewport coordinates
+            and a boolean array (N,) that is True for positions near the viewport
+        """
+        offsets = numpy.asarray(positions, dtype=float).reshape(-1, 2) - (self.x, self.y)
+        viewport = offsets.dot(self.get_rotation_matrix())
+        viewport += (self.view_width / 2, self.view_height / 2)
+        coordinates = viewport.astype(int)  # Truncate like int() does
+        visible = ((coordinates[:, 0] >= -self.margin) & (coordinates[:, 1] >= -self.margin) &
+                   (coordinates[:, 0] <= self.view_width + self.margin) &
+                   (coordinates[:, 1] <= self.view_height + self.margin))
+        return coordinates, visible
+
     def point_at(self, x, y):
         """Points camera at specific coordinates in the world"""
         self.x = x
@@ -66,7 +102,7 @@ class Camera:
     def update(self, time_delta):
         """Updates camera position (rotating, following things)"""
         if self.collidable_to_follow:  # Follow collidable
-            self.point_at(*(self.collidable_to_follow.get_position()))
+            self.point_at(*(self.collidable_to_follow.get_render_position()))
         if self.player_to_follow:  # Follow player
             world_x, world_y, angle = self.player_to_follow.get_data_for_camera()
             self.point_at(world_x, world_y)  # Point at player's position
@@ -85,8 +121,11 @@ class Camera:
 
     def near_viewport(self, position):
         """Returns true if the position(world coordinates) is close to the viewport and can be rendered"""
-        view_x, view_y = self.world_to_viewport(position)
-        margin = 600  # Distance in pixels, any object that is further from the viewport will be ignored
+        return self.viewport_near_view(*self.world_to_viewport(position))
+
+    def viewport_near_view(self, view_x, view_y):
+        """Returns true if viewport coordinates are close enough to the view to be rendered"""
+        margin = self.margin
         if view_x < -margin or view_y < -margin:
             return False
         elif view_x > self.view_width + margin or view_y > self.view_height + margin:
@@ -96,4 +135,20 @@ class Camera:
 
     def start_turn(self, angle_towards):
         """Starts slowly turning the camera around"""
-        self.rotate_towards = angle_towards
\ No newline at end of file
+        self.rotate_towards = angle_towards
+
+    def get_view_bounds(self):
+        """Returns the rectangle of the world that can be rendered (including the margin)
+
+        The rectangle is axis-aligned in world coordinates and encloses the rotated viewport
+
+        Returns:
+            left, top, right, bottom: world coordinates
+        """
+        half_width = self.view_width / 2 + self.margin
+        half_height = self.view_height / 2 + self.margin
+        cos = abs(math.cos(math.radians(self.angle)))
+        sin = abs(math.sin(math.radians(self.angle)))
+        extent_x = cos * half_width + sin * half_height
+        extent_y = sin * half_width + cos * half_height
+        return self.x - extent_x, self.y - extent_y, self.x + extent_x, self.y + extent_y
@@ -19,10 +19,10 @@
 """
 
 try:
-    import pygame  # Need this for pygame.image.load()
     import pymunk
     import math  # Need this for math.radians()
     import sys
+    from assets import asset_cache
 except ImportError as exc:
     print("(!) Could not load module {}, exiting...".format(exc))
     sys.exit(-1)
@@ -33,12 +33,17 @@ class Collidable:
     Class that represents a physical object in the game
     """
     def __init__(self, image_dir, x=0, y=0, angle=0, density=1, body_type='dynamic', shape_type='box'):
-        self.sprite = pygame.image.load(image_dir).convert_alpha()  # Surface with the collidable's image
+        self.image_dir = image_dir
+        self.sprite = asset_cache.acquire(image_dir)  # Surface with the collidable's image (shared)
         self.body = None
         self.set_body(x=x, y=y, angle=angle, density=density,
                       body_type=body_type, shape_type=shape_type)  # Physical body
         self.shape = None
         self.set_shape(shape_type)  # Shape of the body
+        self.previous_position = None  # Body transform before the last physics step
+        self.previous_angle = None
+        self.render_position = None    # Body transform interpolated between physics steps
+        self.render_angle = None
 
     def set_body(self, x=0, y=0, angle=0, density=1, body_type='dynamic', shape_type='box'):
         """Generates body for the collidable based on its sprite
@@ -88,7 +93,50 @@ class Collidable:
         """Returns this collidable's position in world coordinates"""
         return self.body.position
 
+    def get_render_position(self):
+        """Returns the position at which the collidable should be drawn (world coordinates)"""
+        if self.render_position is None:
+            return self.body.position
+        return self.render_position
+
+    def get_render_angle(self):
+        """Returns the angle(in radians) at which the collidable should be drawn"""
+        if self.render_angle is None:
+            return self.body.angle
+        return self.render_angle
+
+    def save_state(self):
+        """Remembers the body's transform before a physics step"""
+        self.previous_position = pymunk.Vec2d(self.body.position)
+        self.previous_angle = self.body.angle
+
+    def interpolate(self, alpha):
+        """Blends the transforms before and after the last physics step for rendering
+
+        Args:
+            alpha: 0 is the transform before the step, 1 is the current transform
+        """
+        if self.previous_position is None:
+            self.render_position = None
+            self.render_angle = None
+            return
+        position = self.body.position
+        self.render_position = self.previous_position + (position - self.previous_position) * alpha
+        self.render_angle = self.previous_angle + (self.body.angle - self.previous_angle) * alpha
+
     def place(self, world_x, world_y, angle):
         """Places body at particular coordinates rotated by an angle(in degrees)"""
         self.body.position = world_x, world_y
         self.body.angle = math.radians(angle)
+        self.previous_position = None  # Do not interpolate from the old place
+        self.render_position = None
+        self.render_angle = None
+
+    def release(self):
+        """Gives the collidable's sprite back to the asset cache
+
+        The collidable should not be drawn after it was released
+        """
+        if self.sprite is not None:
+            asset_cache.release(self.image_dir)
+            self.sprite = None
@@ -0,0 +1,212 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import math  # Need this for math.radians()
+    import numpy
+    import pymunk
+    import random
+    import time  # Need this for time.perf_counter()
+    import sys
+    from collidable import Collidable
+    from utils import angle_differences
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class Fleet:
+    """
+    Many AI cars driven together
+
+    Control inputs and steering decisions live in NumPy arrays, one element per car.
+    update() reads all bodies once, decides throttle and steering for every car in
+    one vectorized pass and writes the resulting forces back in a single loop, so
+    the cost per car stays flat no matter how big the fleet is.
+
+    Cars on autopilot keep to the middle of their tunnel, face their movement angle
+    and hold the cruise speed, and turn around once they are stuck against a wall.
+    Other cars use throttle and steering set from outside.
+    """
+    def __init__(self, world, image_dir="../resources/images/player_car.png", capacity=16,
+                 thrust=8000000, steering_force=1500000, thruster_offset=70, cruise_speed=1200.0):
+        self.world = world
+        self.image_dir = image_dir
+        self.thrust = thrust                  # Force of the main thruster, like Player.accelerate()
+        self.steering_force = steering_force  # Force of the steering thrusters, like Player.steer_right()
+        self.thruster_offset = thruster_offset  # Distance of the steering thrusters from the car's center
+        self.cruise_speed = cruise_speed      # Speed that cars on autopilot hold in pixels per second
+        self.steering_range = 30.0            # Degrees off course at which autopilot steers at full force
+        self.lane_gain = 0.1                  # Degrees of course correction per pixel off the tunnel's middle
+        self.lane_limit = 20.0                # Largest course correction in degrees
+        self.stuck_speed = 50.0               # Autopilot cars slower than this are stuck
+        self.stuck_delay = 1.0                # Seconds a car is stuck before it turns around
+        self.count = 0
+        self.cars = []       # Collidables of the cars
+        self.bodies = []     # Bodies of the cars, in the same order
+        self.pivots = []     # Static bodies that the alignment springs pull towards
+        self.throttle = numpy.zeros(capacity)         # -1 (decelerate) to 1 (accelerate)
+        self.steering = numpy.zeros(capacity)         # -1 (left) to 1 (right)
+        self.movement_angles = numpy.zeros(capacity)  # Degrees that the cars are moving towards
+        self.autopilot = numpy.zeros(capacity, dtype=bool)  # Decide throttle and steering in update()
+        self.positions = numpy.zeros((capacity, 2))   # Body state read at the start of update()
+        self.velocities = numpy.zeros((capacity, 2))
+        self.angles = numpy.zeros(capacity)           # Radians
+        self.stuck_times = numpy.zeros(capacity)      # Seconds the cars have been stuck
+        self.update_time = 0.0  # Seconds spent in update() so far
+
+    @staticmethod
+    def grow(array, size):
+        """Returns a copy of an array with room for at least size rows"""
+        grown = numpy.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def add_car(self, world_x, world_y, angle, autopilot=True):
+        """Adds a car to the fleet and the world
+
+        Args:
+            world_x: world coordinates of the car
+            world_y: world coordinates of the car
+            angle: degrees, the car also starts moving towards this angle
+            autopilot: let the fleet drive the car
+
+        Returns:
+            Index of the car in the fleet
+        """
+        index = self.count
+        if index >= len(self.throttle):
+            for name in ('throttle', 'steering', 'movement_angles', 'autopilot', 'positions', 'velocities',
+                         'angles', 'stuck_times'):
+                setattr(self, name, self.grow(getattr(self, name), index + 1))
+        car = Collidable(image_dir=self.image_dir, x=world_x, y=world_y, angle=angle,
+                         density=1, body_type='dynamic', shape_type='box')
+        pivot = pymunk.Body(body_type=pymunk.Body.STATIC)  # Same alignment spring as the player's car
+        pivot.angle = math.radians(angle)
+        spring = pymunk.DampedRotarySpring(a=car.body, b=pivot, rest_angle=0.0,
+                                           stiffness=150000000.0, damping=75000000.0)
+        self.world.physics.space.add(pivot, spring)
+        self.world.add_collidable(car)
+        self.cars.append(car)
+        self.bodies.append(car.body)
+        self.pivots.append(pivot)
+        self.throttle[index] = 0.0
+        self.steering[index] = 0.0
+        self.movement_angles[index] = angle
+        self.autopilot[index] = autopilot
+        self.stuck_times[index] = 0.0
+        self.count += 1
+        return index
+
+    def spawn_in_level(self, count, seed=None):
+        """Adds cars on autopilot in random tunnel cells of the world's level, moving along the tunnels
+
+        Returns:
+            Number of cars added, less than count if the level has fewer free tunnel cells
+        """
+        level = self.world.level
+        cells, _, orientations = level.get_tunnel_cells()
+        generator = random.Random(seed)
+        chosen = generator.sample(range(len(cells)), min(count, len(cells)))
+        for index in chosen:
+            grid_x, grid_y = cells[index].tolist()
+            if orientations[index] == 0:  # Horizontal tunnel
+                angle = generator.choice((90, 270))
+            else:
+                angle = generator.choice((0, 180))
+            self.add_car((grid_x + 0.5) * level.grid_size, (grid_y + 0.5) * level.grid_size, angle)
+        return len(chosen)
+
+    def set_movement_angles(self, indices, angles):
+        """Sets the angles(in degrees) that cars move towards and turns their alignment springs"""
+        self.movement_angles[indices] = angles
+        for index in numpy.atleast_1d(numpy.arange(self.count)[indices]).tolist():
+            self.pivots[index].angle = math.radians(self.movement_angles[index])
+
+    def read_bodies(self):
+        """Copies the state of every body into the arrays"""
+        count = self.count
+        state = numpy.array([(*body.position, *body.velocity, body.angle) for body in self.bodies],
+                            dtype=float).reshape(count, 5)
+        self.positions[:count] = state[:, 0:2]
+        self.velocities[:count] = state[:, 2:4]
+        self.angles[:count] = state[:, 4]
+
+    def decide(self, time_delta):
+        """Sets throttle and steering of cars on autopilot, all cars at once"""
+        count = self.count
+        auto = self.autopilot[:count]
+        # Turn around cars that have been stuck for a while, e.g. at the end of a dead end
+        speed = numpy.hypot(self.velocities[:count, 0], self.velocities[:count, 1])
+        stuck = auto & (speed < self.stuck_speed)
+        self.stuck_times[:count] = numpy.where(stuck, self.stuck_times[:count] + time_delta, 0.0)
+        turning = numpy.flatnonzero(self.stuck_times[:count] > self.stuck_delay)
+        if len(turning):
+            self.set_movement_angles(turning, (self.movement_angles[turning] + 180) % 360)
+            self.stuck_times[turning] = 0.0
+        movement = numpy.radians(self.movement_angles[:count])
+        forward = numpy.stack((numpy.sin(movement), -numpy.cos(movement)), axis=1)  # Angle 0 is up
+        right = numpy.stack((numpy.cos(movement), numpy.sin(movement)), axis=1)
+        # Keep to the middle of the tunnel: steer towards it by up to lane_limit degrees
+        grid_size = self.world.level.grid_size
+        centers = (numpy.floor(self.positions[:count] / grid_size) + 0.5) * grid_size
+        lateral = ((self.positions[:count] - centers) * right).sum(axis=1)  # Pixels right of the middle
+        correction = numpy.clip(-lateral * self.lane_gain, -self.lane_limit, self.lane_limit)
+        error = angle_differences(numpy.degrees(self.angles[:count]), self.movement_angles[:count] + correction)
+        steering = numpy.clip(error / self.steering_range, -1.0, 1.0)
+        speed = (self.velocities[:count] * forward).sum(axis=1)
+        throttle = numpy.where(speed < self.cruise_speed, 1.0, 0.0)
+        self.steering[:count] = numpy.where(auto, steering, self.steering[:count])
+        self.throttle[:count] = numpy.where(auto, throttle, self.throttle[:count])
+
+    def apply_forces(self):
+        """Writes forces and torques of throttle and steering to the bodies"""
+        count = self.count
+        thrust = self.throttle[:count] * self.thrust
+        sin, cos = numpy.sin(self.angles[:count]), numpy.cos(self.angles[:count])
+        force_x = (thrust * sin).tolist()   # Local (0, -thrust) in world coordinates
+        force_y = (-thrust * cos).tolist()
+        # Two opposite steering thrusters at the front and the back of the car only turn it
+        torque = (self.steering[:count] * self.steering_force * 2 * self.thruster_offset).tolist()
+        for body, x, y, t in zip(self.bodies, force_x, force_y, torque):
+            body.force = x, y
+            body.torque = t
+
+    def update(self, time_delta):
+        """Drives every car for one frame, called before the physics update"""
+        if not self.count:
+            return
+        start = time.perf_counter()
+        self.read_bodies()
+        self.decide(time_delta)
+        self.apply_forces()
+        self.update_time += time.perf_counter() - start
+
+    def clear(self):
+        """Removes every car from the world"""
+        space = self.world.physics.space
+        for car, pivot in zip(self.cars, self.pivots):
+            space.remove(pivot, *pivot.constraints)
+            self.world.remove_collidable(car)
+            car.release()
+        self.count = 0
+        self.cars = []
+        self.bodies = []
+        self.pivots = []
@@ -21,32 +21,76 @@
 try:
     import pygame
     import math  # Need this for math.degrees()
+    import os  # Need this for os.environ
+    import time  # Need this for time.perf_counter()
     import sys
     from window import Window
     from player import Player
     from world import World
     from inputhandler import InputHandler
+    from assets import asset_cache
+    from loader import Loader, prepare_level
+    from profiler import FrameProfiler
+    from simthread import PhysicsThread
+    from resolutionscaler import ResolutionScaler
+    from snapshot import SnapshotRing
 except ImportError as exc:
     print("(!) Could not load module {}, exiting...".format(exc))
     sys.exit(-1)
 
 GAME_VERSION = "v0.1"
+PLAYER_HELD_ACTIONS = ('accelerate', 'decelerate', 'steer_left', 'steer_right')  # Player methods called every frame
+PLAYER_PRESSED_ACTIONS = ('turn_right', 'turn_left')  # Player methods called once per press
+EXCLUSIVE_ACTIONS = (('accelerate', 'decelerate'), ('steer_left', 'steer_right'))  # Opposite actions
+PRELOADED_IMAGES = ("../resources/images/player_car.png",  # Images decoded while the loading screen is shown
+                    "../resources/images/side_wall.png")
 
 
 class Game:
     """
     Class that describes the general game logic
     """
-    def __init__(self, fps=75):
+    def __init__(self, fps=75, physics_step=1/150.0, headless=False, profile_csv=None, level=None,
+                 physics_thread=False, record=None, replay=None, maze=None, seed=None,
+                 resolution=(1920, 1080), dynamic_resolution=True, compositing=False, stream_radius=None,
+                 stream_chunk_cells=4):
         self.fps = fps
+        self.resolution = resolution  # Size of the window
+        self.compositing = compositing  # Draw the world unrotated and rotate the frame once while turning
+        # Lowers the internal render resolution when frames take longer than the frame rate allows
+        self.resolution_scaler = ResolutionScaler(1.0 / fps) if dynamic_resolution else None
+        self.level = level  # Level to play, None to generate one while loading
+        self.maze = maze    # (width, height) in junctions of the maze to generate, None for the test level
+        self.seed = seed    # Seed of the generated maze
+        self.headless = headless  # Run without a real display (SDL dummy video driver)
+        self.physics_step = physics_step  # Fixed physics step in seconds, None to step once per frame
+        self.stream_radius = stream_radius  # Grid cells around cars that have walls, None to add all walls
+        self.stream_chunk_cells = stream_chunk_cells  # Walls are streamed in chunks of this many cells
         self.clock = pygame.time.Clock()  # Clock to keep track of time
         self.window = None
         self.world = None
         self.player = None
+        self.physics_thread = physics_thread  # Simulate on a separate thread instead of once per frame
+        self.simulation = None                # PhysicsThread if physics_thread is set
         self.input_handler = InputHandler()
+        self.game_actions = {'toggle_profiler': self.toggle_profiler,  # Actions that are not player methods
+                             'rewind': self.rewind}
+        self.snapshots = None  # SnapshotRing of the world for rewinding, None while the physics thread runs it
+        self.rewind_checkpoints = 4  # Snapshots to go back on every rewind, a second at 75 fps
+        self.record = record  # File to record input to, saved when the game ends
+        self.replay = replay  # File with recorded input to play instead of live input, as fast as possible
+        self.profile_csv = profile_csv  # File to write per-frame timings to while the game runs
+        self.profiler = FrameProfiler(csv_path=profile_csv)  # Times every part of a frame
+        self.caption_interval = 0.5     # Seconds between window title updates
+        self.caption_timer = 0.0
+        self.loader = None              # Loads images and the level on worker threads during the loading screen
+        self.loading_font = None
+        self.start_time = None          # When run() was called (time.perf_counter())
+        self.first_frame_time = None    # Seconds from start_time until the first interactive frame was shown
 
     def run(self):
         """Initializes everything and starts main game loop"""
+        self.start_time = time.perf_counter()
         self.init_pygame()          # Initialize engine
         self.create_window()        # Create app window
         self.show_loading_screen()  # Show splash screen
@@ -57,73 +101,224 @@ class Game:
 
     def create_window(self):
         """Creates a pygame window"""
-        self.window = Window(1920, 1080, "space-delivery-game", 0)
+        self.window = Window(self.resolution[0], self.resolution[1], "space-delivery-game", 0,
+                             compositing=self.compositing)
+        self.window.profiler = self.profiler  # Let the window time its rendering phases
         #self.window.toggle_fullscreen()
 
     def show_loading_screen(self):
-        """Displays a splash screen"""
-        pass
+        """Loads the game on worker threads and displays a splash screen with progress meanwhile
+
+        First images are decoded and the level is generated and its walls exported, then the
+        sprites and bodies of the walls are created. The main thread keeps drawing and handling
+        window events, it only converts images and creates the world in between.
+        init() adds the results to the physical simulation.
+        """
+        self.loader = Loader()
+        for image_dir in PRELOADED_IMAGES:
+            self.loader.load_image(image_dir)
+        self.loader.submit('level', prepare_level, self.level, self.maze, self.seed)
+        self.wait_for_loader(0.0, 0.3)
+        for image_dir in PRELOADED_IMAGES:  # Converting to the display's format needs the main thread
+            asset_cache.store(image_dir, self.loader.get_result(image_dir))
+        self.level, wall_table = self.loader.get_result('level')
+        self.world = self.create_world()
+        self.loader.submit('walls', self.world.create_walls, wall_table, self.loader.report('walls'))
+        self.wait_for_loader(0.3, 1.0, ['walls'])
+        self.loader.shutdown()
+        print("(+) Loaded in {:.2f} s".format(self.loader.get_load_time()))
+
+    def wait_for_loader(self, start, end, names=None):
+        """Draws the loading screen until the loader's jobs are done
+
+        Args:
+            start: progress shown before the jobs start, from 0 to 1
+            end: progress shown once the jobs are done
+            names: names of the jobs to wait for, None for all
+        """
+        while not self.loader.is_done():
+            pygame.event.pump()  # Keep the window responsive, QUIT stays queued for the main loop
+            self.draw_loading_screen(start + (end - start) * self.loader.get_progress(names))
+            self.clock.tick(30)
+        self.draw_loading_screen(end)
+
+    def draw_loading_screen(self, progress):
+        """Draws a progress bar, progress goes from 0 to 1"""
+        if self.loading_font is None:
+            self.loading_font = pygame.font.SysFont(None, 48)
+        screen = self.window.screen
+        width, height = screen.get_size()
+        screen.fill((20, 20, 30))
+        text = self.loading_font.render("Loading... {}%".format(int(progress * 100)), True, (255, 255, 255))
+        screen.blit(text, text.get_rect(center=(width // 2, height // 2 - 40)))
+        bar = pygame.Rect(0, 0, width // 3, 24)
+        bar.center = (width // 2, height // 2 + 10)
+        pygame.draw.rect(screen, (255, 255, 255), bar, 2)
+        filled = bar.inflate(-8, -8)
+        filled.width = int(filled.width * progress)
+        pygame.draw.rect(screen, (130, 200, 100), filled)
+        pygame.display.flip()
+
+    def create_world(self):
+        """Creates the world for the level with the game's physics and wall streaming settings"""
+        return World(physics_step=self.physics_step, stream_radius=self.stream_radius,
+                     stream_chunk_cells=self.stream_chunk_cells, level=self.level)
 
     def init(self):
-        """Initializes things that are global in the scope of the gam"""
-        self.world = World()           # Create world
-        self.world.build_from_level()  # Add level to the world
+        """Initializes things that are global in the scope of the game
+
+        After the loading screen only the walls are left to be added to the physical
+        simulation, without it everything is loaded right here
+        """
+        if self.loader is None:
+            self.level, wall_table = prepare_level(self.level, self.maze, self.seed)
+            self.world = self.create_world()
+            self.world.build_from_level(wall_table)  # Add level to the world
+        else:
+            self.world.add_walls(self.loader.get_result('walls'))
         self.spawn_player()            # Add player to the world
+        if self.replay is not None:
+            self.input_handler.load_replay(self.replay)
+            if self.physics_thread:
+                print("(!) Replays are only deterministic with physics on the main thread, not using a thread")
+                self.physics_thread = False
+        elif self.record is not None:
+            self.input_handler.start_recording()
+        if self.physics_thread:        # From now on only the thread touches the physical simulation
+            self.simulation = PhysicsThread(self.world, self.player, rate=1.0 / (self.physics_step or 1/150.0))
+            self.simulation.start()
+        else:                          # Snapshots are taken between world updates, so not with a thread
+            self.snapshots = SnapshotRing(self.world, self.player,
+                                          self.window.camera if self.window is not None else None)
 
     def init_pygame(self):
         """Initializes pygame"""
+        if self.headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'  # Render into memory, no window is shown
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'  # Machines without a display often lack sound too
         check_errors = pygame.init()
         if check_errors[1] > 0:
             print("(!) Had {0} errors initializing PyGame, exiting...".format(check_errors[1]))
             sys.exit(-1)
         else:
             print("(+) PyGame successfully initialized!")
+        self.input_handler.open_joysticks()  # Gamepads only send events once opened
 
     def main_loop(self):
         """Runs the game frame by frame"""
-        while not pygame.event.peek(pygame.QUIT):
-            milliseconds = self.clock.tick(self.fps)  # Limit fps
+        while not pygame.event.peek(pygame.QUIT) and not self.input_handler.is_replay_finished():
+            if self.replay is None:
+                milliseconds = self.clock.tick(self.fps)  # Limit fps
+            else:
+                milliseconds = self.clock.tick()  # Replays run as fast as possible
             time_delta = milliseconds / 1000.0  # Seconds passed since last frame
-            pass  # Update current state
-            self.handle_input()  # Handle input
-            self.world.update(time_delta)  # Update world (physics, etc.)
+            frame_start = time.perf_counter()
+            self.profiler.begin_frame()
+            with self.profiler.section('input'):
+                time_delta = self.handle_input(time_delta)  # Handle input, replays also decide the frame time
+            with self.profiler.section('world'):
+                if self.simulation is None:
+                    self.world.update(time_delta)  # Update world (physics, etc.)
+                    self.snapshots.update()  # Remember the world every few ticks for rewinding
+                else:
+                    self.simulation.apply_snapshot()  # Draw the state the physics thread published
             #self.player.update(time_delta)  # Update the player
-            self.window.camera.update(time_delta)  # Move the camera
-            self.render() # Draw everything
-            # Show current fps in the window title
-            pygame.display.set_caption("space-delivery-game {ver} fps: {fps}".format(ver=GAME_VERSION,
-                                                                                    fps=str(int(self.clock.get_fps()))))
-
-    def handle_input(self):
-        """Handles all input"""
-        self.input_handler.update()  # Update input handler
-        # Control player
-        if self.input_handler.keypress[ord('w')]:    # Accelerate
-            self.player.accelerate()
-        elif self.input_handler.keypress[ord('s')]:  # Decelerate
-            self.player.decelerate()
-        if self.input_handler.keypress[ord('a')]:    # Steer left
-            self.player.steer_left()
-        elif self.input_handler.keypress[ord('d')]:  # Steer right
-            self.player.steer_right()
-        # TEMP
-        if self.input_handler.keydown[ord('e')]:   # Turn right
-            self.player.turn_right()
-        if self.input_handler.keydown[ord('q')]:  # Turn left
-            self.player.turn_left()
-        # /TEMP
+            with self.profiler.section('camera'):
+                self.window.camera.update(time_delta)  # Move the camera
+            with self.profiler.section('render'):
+                self.render() # Draw everything
+            self.profiler.end_frame()
+            if self.resolution_scaler is not None:  # Work of this frame decides the next frame's resolution
+                self.window.set_render_scale(self.resolution_scaler.update(time.perf_counter() - frame_start))
+            if self.first_frame_time is None:
+                self.first_frame_time = time.perf_counter() - self.start_time
+                print("(+) First interactive frame after {:.2f} s".format(self.first_frame_time))
+            self.update_caption(time_delta)
+        if self.simulation is not None:
+            self.simulation.stop()
+        if self.record is not None and self.replay is None:
+            self.input_handler.save_recording(self.record)
+        if self.replay is not None:
+            p50, p95, p99 = self.profiler.get_frame_percentiles()
+            print("(+) Replayed {} frames, frame time p50 {:.2f} ms  p95 {:.2f} ms  p99 {:.2f} ms".format(
+                self.input_handler.replay_frame, p50 * 1000, p95 * 1000, p99 * 1000))
+        self.profiler.close()  # Write the last timings
+
+    def update_caption(self, time_delta):
+        """Shows current fps and frame times in the window title a few times per second"""
+        self.caption_timer += time_delta
+        if self.caption_timer < self.caption_interval:
+            return
+        self.caption_timer = 0.0
+        p50, p95, p99 = self.profiler.get_frame_percentiles()
+        pygame.display.set_caption("space-delivery-game {ver} fps: {fps} p95: {p95:.1f} ms scale: {scale}%".format(
+            ver=GAME_VERSION, fps=str(int(self.clock.get_fps())), p95=p95 * 1000,
+            scale=int(self.window.render_scale * 100)))
+
+    def handle_input(self, time_delta=None):
+        """Handles all input
+
+        Returns:
+            Seconds that the frame lasts, recorded time while replaying input
+        """
+        time_delta = self.input_handler.update(time_delta)  # Update input handler
+        held = self.input_handler.get_held_actions()
+        for first, second in EXCLUSIVE_ACTIONS:  # Only the first of two opposite actions acts
+            if first in held and second in held:
+                held.remove(second)
+        pressed = self.input_handler.get_pressed_actions()
+        for action in pressed:
+            if action in self.game_actions:
+                self.game_actions[action]()
+        self.control_player([action for action in held if action in PLAYER_HELD_ACTIONS],
+                            [action for action in pressed if action in PLAYER_PRESSED_ACTIONS])
+        self.input_handler.end_frame()  # Presses are handled, the next frame starts with none
+        return time_delta
+
+    def rewind(self):
+        """Puts the world back by rewind_checkpoints snapshots, or to the oldest one there is"""
+        if self.snapshots is None:  # The physics thread owns the world
+            return
+        self.snapshots.rewind(min(self.rewind_checkpoints, self.snapshots.count - 1))
+
+    def toggle_profiler(self):
+        """Shows/hides frame timings"""
+        self.profiler.show_overlay = not self.profiler.show_overlay
+
+    def control_player(self, held, pressed):
+        """Calls player methods, or hands them to the physics thread if there is one
+
+        Args:
+            held: player methods that act while a key is held, e.g. ['accelerate']
+            pressed: player methods that act once, e.g. ['turn_right']
+        """
+        if self.simulation is not None:  # The thread calls them before its next steps
+            self.simulation.hold(held)
+            for action in pressed:
+                self.simulation.post(action)
+            return
+        for action in held + pressed:
+            getattr(self.player, action)()
 
     def render(self):
         """Renders everything"""
         self.window.fill((130, 200, 100))  # Draw background
+        self.window.begin_world()  # Draw the world unrotated if compositing
         self.world.render(self.window)  # Draw the world
         self.window.draw_collidable(self.player.car)  # Draw player
+        self.window.end_world()
+        self.window.present()  # Draw everything queued so far and upscale it to the screen
+        overlay = self.profiler.draw_overlay(self.window.screen)  # Draw frame timings
+        if overlay is not None:
+            self.window.mark_dirty(overlay)
         self.window.update()  # Update the window
 
     def spawn_player(self):
         """Creates a player and adds him to the world"""
         self.player = Player()  # Load player
         self.player.place_in_world(self.world)  # Place player in the world
+        if self.window is None:  # Physics-only game
+            return
         self.window.camera.follow_player(self.player)  # Follow player with the camera
         self.window.camera.start_turn(math.degrees(self.player.car.body.angle))  # Align camera with the player
         #self.window.camera.angle = math.degrees(self.player.car.body.angle)  # Align camera with the player
@@ -20,33 +20,265 @@
 
 try:
     import pygame
+    import numpy
+    import struct
     import sys
+    from collections import defaultdict
 except ImportError as exc:
     print("(!) Could not load module {}, exiting...".format(exc))
     sys.exit(-1)
 
+# Everything the player can do, recordings store the state of every action
+ACTIONS = ('accelerate', 'decelerate', 'steer_left', 'steer_right', 'turn_right', 'turn_left', 'toggle_profiler',
+           'rewind')
+# Inputs are ('key', key code), ('axis', axis, direction -1 or 1) and ('button', button) of any gamepad
+DEFAULT_BINDINGS = {
+    ('key', ord('w')): 'accelerate',
+    ('key', ord('s')): 'decelerate',
+    ('key', ord('a')): 'steer_left',
+    ('key', ord('d')): 'steer_right',
+    ('key', ord('e')): 'turn_right',
+    ('key', ord('q')): 'turn_left',
+    ('key', ord('p')): 'toggle_profiler',
+    ('key', pygame.K_BACKSPACE): 'rewind',
+    ('key', pygame.K_UP): 'accelerate',
+    ('key', pygame.K_DOWN): 'decelerate',
+    ('key', pygame.K_LEFT): 'steer_left',
+    ('key', pygame.K_RIGHT): 'steer_right',
+    ('axis', 1, -1): 'accelerate',  # Left stick
+    ('axis', 1, 1): 'decelerate',
+    ('axis', 0, -1): 'steer_left',
+    ('axis', 0, 1): 'steer_right',
+    ('button', 5): 'turn_right',    # Shoulder buttons
+    ('button', 4): 'turn_left',
+    ('button', 6): 'rewind',        # Back button
+}
+
+# Input recording format, all numbers are little endian:
+#   header (see RECORDING_HEADER)
+#   names:  names of the recorded actions separated by newlines, padded with zeros to a multiple of 8 bytes
+#   frames: RECORDING_FRAME[frame_count]  time delta and bitmasks of held and pressed actions (bit 0 is the first name)
+RECORDING_MAGIC = b'SDLR'
+RECORDING_VERSION = 2
+RECORDING_HEADER = struct.Struct('<4sHHII')  # magic, version, padding, names length, frame count
+RECORDING_FRAME = numpy.dtype([('time_delta', '<f8'), ('held', '<u4'), ('pressed', '<u4')])
+
 
 class InputHandler:
     """
     Class that builds on top of pygame to provide advanced input processing
+
+    Inputs (keys, gamepad axes and buttons) are mapped to actions by a binding table.
+    An action is held while any of its inputs is held and pressed on the frame
+    one of them goes down. Every event is handled with a few dictionary lookups,
+    and only the state that was set on the last frame is cleared.
+    AI or scripts can drive the same actions with hold() and press().
     """
-    def __init__(self):
-        self.keys = range(ord('a'), ord('z')+1)  # Keys that are being monitored by handler
-        values = [False] * len(self.keys)        # Values are true when keys are down/pressed
-        self.keydown = dict(zip(self.keys, values))   # { ord('a'): False, ord('b'): False, ... }
-        self.keypress = dict(zip(self.keys, values))  # Key press happens between key down and key up
-
-    def update(self):
-        """Updates keydown/keypress events"""
-        for key in self.keys:  # Drop key downs
+    def __init__(self, bindings=None, dead_zone=0.5):
+        self.bindings = dict(DEFAULT_BINDINGS if bindings is None else bindings)  # { input: action }
+        self.dead_zone = dead_zone  # How far a gamepad axis has to be pushed to count as held
+        self.keydown = defaultdict(bool)   # { key code: True } for keys that went down this frame
+        self.keypress = defaultdict(bool)  # Key press happens between key down and key up
+        self.new_keys = []        # Keys that went down this frame, cleared on the next one
+        self.inputs_held = set()  # (input, device) of held bound inputs, device is a gamepad id or None
+        self.held = {}            # { action: number of inputs holding it }
+        self.pressed = set()      # Actions pressed this frame
+        self.injected = set()     # Actions held by hold()
+        self.joysticks = {}       # { instance id: pygame.joystick.Joystick } open gamepads
+        self.recording = None   # [(time delta, held bitmask, pressed bitmask)] while recording
+        self.replay = None      # Array of RECORDING_FRAME while replaying
+        self.replay_actions = ACTIONS  # Actions in the order of the replay's bits
+        self.replay_frame = 0   # Next frame of the replay
+
+    def bind(self, control, action):
+        """Maps an input to an action, e.g. bind(('key', pygame.K_SPACE), 'decelerate')
+
+        Raises:
+            ValueError: If the action is unknown
+        """
+        if action not in ACTIONS:
+            raise ValueError("(!) Error: unknown action {}".format(action))
+        self.release_control(control)
+        self.bindings[control] = action
+
+    def unbind(self, control):
+        """Removes an input from the binding table"""
+        self.release_control(control)
+        self.bindings.pop(control, None)
+
+    def open_joysticks(self):
+        """Opens all connected gamepads so that they send events (needs an initialized pygame)"""
+        for index in range(pygame.joystick.get_count()):
+            joystick = pygame.joystick.Joystick(index)
+            self.joysticks[joystick.get_instance_id()] = joystick
+
+    def update(self, time_delta=None):
+        """Updates keydown/keypress events and actions
+
+        While replaying, actions come from the next recorded frame instead of events
+
+        Args:
+            time_delta: seconds since the last frame, recorded along with the actions
+
+        Actions pressed with press() or hold() before update() count as pressed on this
+        frame, call end_frame() once the actions of the frame were handled
+
+        Returns:
+            Seconds that the frame should last: time_delta, or the recorded time delta while replaying
+        """
+        if self.replay is not None:
+            return self.replay_next()
+        self.process_events()
+        if self.recording is not None:
+            self.recording.append((time_delta or 0.0, self.get_bitmask(self.get_held_actions()),
+                                   self.get_bitmask(self.pressed)))
+        return time_delta
+
+    def end_frame(self):
+        """Forgets the actions pressed this frame, call it after the frame's actions were handled"""
+        self.pressed = set()
+
+    def process_events(self):
+        """Updates keydown/keypress and actions from pygame events"""
+        for key in self.new_keys:  # Drop key downs of the last frame
             self.keydown[key] = False
-        for event in pygame.event.get():  # Process events
-            if event.type is pygame.KEYDOWN:
-                for key in self.keys:
-                    if event.key == key:
-                        self.keydown[key] = True
-                        self.keypress[key] = True
-            elif event.type is pygame.KEYUP:
-                for key in self.keys:
-                    if (event.key == key):
-                        self.keypress[key] = False
\ No newline at end of file
+        self.new_keys = []
+        for event in pygame.event.get(exclude=pygame.QUIT):  # Process events, QUIT is left for the game loop
+            if event.type == pygame.KEYDOWN:
+                self.keydown[event.key] = True
+                self.keypress[event.key] = True
+                self.new_keys.append(event.key)
+                self.hold_input(('key', event.key))
+            elif event.type == pygame.KEYUP:
+                self.keypress[event.key] = False
+                self.release_input(('key', event.key))
+            elif event.type == pygame.JOYAXISMOTION:
+                for direction in (-1, 1):
+                    if event.value * direction > self.dead_zone:
+                        self.hold_input(('axis', event.axis, direction), event.instance_id)
+                    else:
+                        self.release_input(('axis', event.axis, direction), event.instance_id)
+            elif event.type == pygame.JOYBUTTONDOWN:
+                self.hold_input(('button', event.button), event.instance_id)
+            elif event.type == pygame.JOYBUTTONUP:
+                self.release_input(('button', event.button), event.instance_id)
+            elif event.type == pygame.JOYDEVICEADDED:
+                joystick = pygame.joystick.Joystick(event.device_index)
+                self.joysticks[joystick.get_instance_id()] = joystick
+            elif event.type == pygame.JOYDEVICEREMOVED:
+                self.joysticks.pop(event.instance_id, None)
+                for control, device in list(self.inputs_held):  # A gamepad that is gone holds nothing
+                    if device == event.instance_id:
+                        self.release_input(control, device)
+
+    def hold_input(self, control, device=None):
+        """Marks a bound input as held, its action is pressed if the input was not held yet
+
+        Args:
+            control: the input, see DEFAULT_BINDINGS
+            device: instance id of the gamepad, None for the keyboard
+        """
+        action = self.bindings.get(control)
+        if action is None or (control, device) in self.inputs_held:
+            return
+        self.inputs_held.add((control, device))
+        self.held[action] = self.held.get(action, 0) + 1
+        self.pressed.add(action)
+
+    def release_input(self, control, device=None):
+        """Marks a bound input of a device as released, see hold_input()"""
+        if (control, device) not in self.inputs_held:
+            return
+        self.inputs_held.remove((control, device))
+        action = self.bindings[control]
+        self.held[action] -= 1
+
+    def release_control(self, control):
+        """Marks a bound input as released on every device that holds it"""
+        for held_control, device in list(self.inputs_held):
+            if held_control == control:
+                self.release_input(control, device)
+
+    def hold(self, action, held=True):
+        """Holds or releases an action without any input (for AI and scripts)"""
+        if held:
+            if action not in self.injected:
+                self.pressed.add(action)
+            self.injected.add(action)
+        else:
+            self.injected.discard(action)
+
+    def press(self, action):
+        """Presses an action for the current frame without any input (for AI and scripts)"""
+        self.pressed.add(action)
+
+    def is_held(self, action):
+        """Returns true if an action is held"""
+        return self.held.get(action, 0) > 0 or action in self.injected
+
+    def get_held_actions(self):
+        """Returns all held actions in the order of ACTIONS"""
+        return [action for action in ACTIONS if self.is_held(action)]
+
+    def get_pressed_actions(self):
+        """Returns all actions pressed this frame in the order of ACTIONS"""
+        return [action for action in ACTIONS if action in self.pressed]
+
+    @staticmethod
+    def get_bitmask(actions):
+        """Packs actions into an integer, bit 0 is the first action of ACTIONS"""
+        bitmask = 0
+        for action in actions:
+            bitmask |= 1 << ACTIONS.index(action)
+        return bitmask
+
+    def start_recording(self):
+        """Starts recording the state of the actions every frame"""
+        self.recording = []
+
+    def save_recording(self, path):
+        """Writes everything recorded since start_recording() to a file"""
+        frames = numpy.array(self.recording or [], dtype=RECORDING_FRAME)
+        names = '\n'.join(ACTIONS).encode('utf-8')
+        names += b'\0' * (-len(names) % 8)
+        with open(path, 'wb') as file:
+            file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, 0, len(names), len(frames)))
+            file.write(names)
+            file.write(frames.tobytes())
+
+    def load_replay(self, path):
+        """Replays a file written by save_recording(), update() ignores live events from now on
+
+        Raises:
+            ValueError: If the file is not a recording or contains unknown actions
+        """
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < RECORDING_HEADER.size:
+            raise ValueError("(!) Error: {} is not an input recording".format(path))
+        magic, version, _, names_length, frame_count = RECORDING_HEADER.unpack_from(data, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError("(!) Error: {} is not an input recording".format(path))
+        names = data[RECORDING_HEADER.size:RECORDING_HEADER.size + names_length]
+        self.replay_actions = tuple(names.rstrip(b'\0').decode('utf-8').split('\n'))
+        unknown = [action for action in self.replay_actions if action not in ACTIONS]
+        if unknown:
+            raise ValueError("(!) Error: {} contains unknown actions {}".format(path, ', '.join(unknown)))
+        self.replay = numpy.frombuffer(data, dtype=RECORDING_FRAME, count=frame_count,
+                                       offset=RECORDING_HEADER.size + names_length)
+        self.replay_frame = 0
+
+    def replay_next(self):
+        """Sets the actions from the next recorded frame and returns its time delta"""
+        pygame.event.get(exclude=pygame.QUIT)  # Live input is ignored, but the window has to stay responsive
+        if self.is_replay_finished():
+            return 0.0
+        time_delta, held, pressed = self.replay[self.replay_frame].tolist()
+        self.replay_frame += 1
+        self.held = {action: held >> bit & 1 for bit, action in enumerate(self.replay_actions)}
+        self.pressed = {action for bit, action in enumerate(self.replay_actions) if pressed >> bit & 1}
+        return time_delta
+
+    def is_replay_finished(self):
+        """Returns true if every frame of the replay was played, false if not replaying"""
+        return self.replay is not None and self.replay_frame >= len(self.replay)
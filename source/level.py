@@ -18,6 +18,22 @@
     Copyright(C) 2017 Oleksii Davydenko
 """
 
+try:
+    import numpy
+    import random
+    import time  # Need this for time.perf_counter()
+    import sys
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+WALL_BITS = {'up': 1, 'down': 2, 'left': 4, 'right': 8}  # Bits of a junction's wall bitmask
+ALL_WALLS = 15
+ORIENTATIONS = ("Horizontal", "Vertical")
+# Position of a wall inside its grid cell in cells, and the wall's orientation, for every direction
+WALL_OFFSETS = {'up': (0.5, 0.0, 0), 'down': (0.5, 1.0, 0), 'left': (0.0, 0.5, 1), 'right': (1.0, 0.5, 1)}
+
 
 class Level:
     """
@@ -28,13 +44,77 @@ class Level:
     Y: top to bottom
     """
     def __init__(self):
-        self.junctions = []          # All junctions in the level
-        self.tunnels = []            # All tunnels in the level
+        self.layout_source = None    # Loads junctions and tunnels once they are first used (e.g. a level file)
+        self.storage = LevelStorage()  # Arrays with all junctions and tunnels
+        self.junctions = StorageList(self.storage, Junction)  # All junctions in the level
+        self.tunnels = StorageList(self.storage, Tunnel)      # All tunnels in the level
         self.entry_point = None      # The point where player enters the level
         self.entry_direction = None  # Direction to the first tunnel that the player goes through
         # TODO: this should scale with screen resolution
         # This should always be equal to (wall sprite height - wall sprite width)
         self.grid_size = 920        # Size of each cell on the map grid in pixels (50px is approximately 1 meter)
+        self.cells = CellMap(self.storage)  # { (grid_x, grid_y): Tunnel or Junction } for every occupied cell
+        self.wall_source = None     # Object with precomputed walls (e.g. a level file), None to generate them
+
+    def load_layout(self):
+        """Loads junctions and tunnels from layout_source if that has not happened yet
+
+        Called by every property of the layout, so a level loaded from a file only decodes
+        its junctions and tunnels once something needs them
+        """
+        if self.layout_source is not None:
+            source, self.layout_source = self.layout_source, None
+            source.load_layout(self)
+
+    @property
+    def storage(self):
+        """Arrays with all junctions and tunnels"""
+        self.load_layout()
+        return self._storage
+
+    @storage.setter
+    def storage(self, storage):
+        self._storage = storage
+
+    @property
+    def junctions(self):
+        """All junctions in the level"""
+        self.load_layout()
+        return self._junctions
+
+    @junctions.setter
+    def junctions(self, junctions):
+        self._junctions = junctions
+
+    @property
+    def tunnels(self):
+        """All tunnels in the level"""
+        self.load_layout()
+        return self._tunnels
+
+    @tunnels.setter
+    def tunnels(self, tunnels):
+        self._tunnels = tunnels
+
+    @property
+    def entry_point(self):
+        """The junction where player enters the level"""
+        self.load_layout()
+        return self._entry_point
+
+    @entry_point.setter
+    def entry_point(self, entry_point):
+        self._entry_point = entry_point
+
+    @property
+    def cells(self):
+        """{ (grid_x, grid_y): Tunnel or Junction } for every occupied cell"""
+        self.load_layout()
+        return self._cells
+
+    @cells.setter
+    def cells(self, cells):
+        self._cells = cells
 
     def generate_test_level(self):
         """Generates a basic level"""
@@ -69,6 +149,80 @@ class Level:
         self.entry_point = self.junctions[2]
         self.entry_direction = 'right'
 
+    def generate_maze(self, width, height, spacing=4, seed=None, loop_chance=0.1):
+        """Generates a connected maze of junctions placed on a regular grid
+
+        A random spanning tree of the junction grid is carved first, so every junction
+        can be reached, then some of the remaining neighbouring junctions are joined
+        as well to create loops. Runs in time linear in the number of junctions.
+
+        Args:
+            width: number of junctions in a row
+            height: number of junctions in a column
+            spacing: distance between neighbouring junctions in grid cells (tunnel length + 1, at least 2)
+            seed: seed for the random generator, the same seed always gives the same maze
+            loop_chance: probability that two neighbouring junctions not joined by the spanning tree are joined
+
+        Returns:
+            Time it took to generate the maze in seconds
+
+        Raises:
+            ValueError: If the maze is too small or the spacing leaves no room for tunnels
+        """
+        if width < 1 or height < 1 or width * height < 2:
+            raise ValueError("(!) Error: a maze needs at least two junctions")
+        if spacing < 2:
+            raise ValueError("(!) Error: junctions must be at least two cells apart")
+        start_time = time.perf_counter()
+        generator = random.Random(seed)
+        first = len(self.junctions)  # Index of the maze's first junction
+        tunnels = []  # Pairs of maze junction indices joined by tunnels, the first one leaves the first junction
+
+        def neighbours(index):
+            x, y = index % width, index // width
+            if x > 0: yield index - 1
+            if x < width - 1: yield index + 1
+            if y > 0: yield index - width
+            if y < height - 1: yield index + width
+
+        # Carve a spanning tree with an iterative randomized depth-first search
+        visited = [False] * (width * height)
+        visited[0] = True
+        stack = [0]
+        joined = set()  # Pairs of junctions (smaller index first) that are already joined
+        while stack:
+            current = stack[-1]
+            unvisited = [index for index in neighbours(current) if not visited[index]]
+            if not unvisited:
+                stack.pop()
+                continue
+            chosen = generator.choice(unvisited)
+            visited[chosen] = True
+            tunnels.append((current, chosen))
+            joined.add((min(current, chosen), max(current, chosen)))
+            stack.append(chosen)
+        # Add loops
+        for index in range(width * height):
+            for neighbour in (index + 1 if index % width < width - 1 else None,
+                              index + width if index + width < width * height else None):
+                if neighbour is not None and (index, neighbour) not in joined \
+                        and generator.random() < loop_chance:
+                    tunnels.append((index, neighbour))
+        # Join everything at once, after the junctions and tunnels that are already in the level
+        storage = self.storage
+        joined_before = storage.tunnel_orientations[:storage.tunnel_count] >= 0
+        entry_tunnel = numpy.count_nonzero(joined_before)
+        grid = numpy.indices((height, width)).reshape(2, -1)[::-1].T * spacing  # (x, y) of every maze junction
+        self.load_arrays(numpy.concatenate((storage.junction_coordinates[:storage.junction_count], grid)),
+                         numpy.concatenate((storage.tunnel_junctions[:storage.tunnel_count][joined_before],
+                                            numpy.array(tunnels, dtype=numpy.int32) + first)))
+        # Enter through the first junction, towards its first tunnel
+        self.entry_point = self.junctions[first]
+        tunnel = self.tunnels[entry_tunnel]
+        other = tunnel.junctions[1] if tunnel.junctions[0] == self.entry_point else tunnel.junctions[0]
+        self.entry_direction = 'right' if other.x > self.entry_point.x else 'down'
+        return time.perf_counter() - start_time
+
     @staticmethod
     def join(junction_from, tunnel, junction_to):
         """Joins two junctions with a tunnel
@@ -85,6 +239,9 @@ class Level:
                 or not isinstance(junction_to, Junction)\
                 or not isinstance(tunnel, Tunnel):
             raise AttributeError("(!) Error: Level.join() uses Junction and Tunnel arguments")
+        storage = junction_from.storage  # Everything has to be stored together
+        storage.adopt(junction_to)
+        storage.adopt(tunnel)
         # Set tunnel orientation
         if junction_from.y == junction_to.y:    # Horizontal
             tunnel.orientation = "Horizontal"
@@ -95,27 +252,24 @@ class Level:
         # Break walls to accomodate the tunnel
         if tunnel.orientation is "Horizontal":
             if junction_from.x < junction_to.x:
-                junction_from.walls['right'] = False
-                junction_to.walls['left'] = False
+                direction_from, direction_to = 'right', 'left'
             elif junction_from.x > junction_to.x:
-                junction_from.walls['left'] = False
-                junction_to.walls['right'] = False
+                direction_from, direction_to = 'left', 'right'
             else:
                 raise RuntimeError("(!) Error: trying to join two junctions with equal coordinates")
         elif tunnel.orientation is "Vertical":
             if junction_from.y < junction_to.y:
-                junction_from.walls['down'] = False
-                junction_to.walls['up'] = False
+                direction_from, direction_to = 'down', 'up'
             elif junction_from.y > junction_to.y:
-                junction_from.walls['up'] = False
-                junction_to.walls['down'] = False
+                direction_from, direction_to = 'up', 'down'
             else:
                 raise RuntimeError("(!) Error: trying to join two junctions with equal coordinates")
+        junction_from.walls[direction_from] = False
+        junction_to.walls[direction_to] = False
         # Finalize
-        tunnel.junctions[0] = junction_from  # Add junctions to tunnel
-        tunnel.junctions[1] = junction_to
-        junction_from.tunnels.append(tunnel)  # Add tunnel to junctions
-        junction_to.tunnels.append(tunnel)
+        tunnel.set_junctions(junction_from, junction_to)  # Add junctions to tunnel
+        junction_from.add_tunnel(tunnel, direction_from)  # Add tunnel to junctions
+        junction_to.add_tunnel(tunnel, direction_to)
 
     def join_existing(self, junction_from, tunnel, junction_to):
         """Joins two junctions with a tunnel
@@ -139,6 +293,89 @@ class Level:
         j_to = self.junctions[junction_to]
         t_through = self.tunnels[tunnel]
         Level.join(j_from, t_through, j_to)
+        self.wall_source = None    # Precomputed walls are out of date
+        self.occupy_cells(j_from)  # Keep the cell map up to date
+        self.occupy_cells(j_to)
+        self.occupy_cells(t_through)
+
+    def occupy_cells(self, element):
+        """Marks the grid cells taken by a junction or a joined tunnel in the cell map
+
+        Raises:
+            TypeError: If element is not a Junction or a Tunnel
+        """
+        if isinstance(element, Junction):
+            self.cells[(element.x, element.y)] = element
+        elif isinstance(element, Tunnel):
+            self.cells.occupy(element.get_left_bound(), element.get_top_bound(),
+                              element.get_right_bound(), element.get_bottom_bound(), element)
+        else:
+            raise TypeError("(!) Error: only junctions and tunnels can occupy level cells")
+
+    def build_cell_map(self):
+        """Rebuilds the cell map from scratch
+
+        Only needed if junctions were joined with Level.join() instead of join_existing()
+        """
+        storage = self.storage
+        self.cells = CellMap(storage)
+        self.cells.fill(storage.junction_coordinates[:storage.junction_count],
+                        numpy.arange(1, storage.junction_count + 1, dtype=numpy.int32))
+        cells, tunnel_index, _ = self.get_tunnel_cells()
+        self.cells.fill(cells, -tunnel_index.astype(numpy.int32) - 1)
+
+    def load_arrays(self, junction_coordinates, tunnel_junctions):
+        """Replaces the layout of the level with junctions and tunnels given as arrays
+
+        Does the same as adding every junction and tunnel and calling join_existing() for
+        every tunnel, but all at once, which is much faster for big levels. Junctions and
+        tunnels taken from the level before are invalidated, see LevelStorage.invalidate()
+
+        Args:
+            junction_coordinates: array (N, 2) of grid coordinates of junctions
+            tunnel_junctions: array (M, 2) of indices of the junctions every tunnel goes from and to
+
+        Raises:
+            IndexError: If tunnels reference junctions that do not exist
+            RuntimeError: If junctions are not properly aligned (on one horizontal or vertical line)
+        """
+        junction_coordinates = numpy.asarray(junction_coordinates, dtype=numpy.int32).reshape(-1, 2)
+        tunnel_junctions = numpy.asarray(tunnel_junctions, dtype=numpy.int32).reshape(-1, 2)
+        if len(tunnel_junctions) and (tunnel_junctions.min() < 0
+                                      or tunnel_junctions.max() >= len(junction_coordinates)):
+            raise IndexError("(!) Error: tunnel joins a junction that does not exist")
+        start = junction_coordinates[tunnel_junctions[:, 0]]
+        end = junction_coordinates[tunnel_junctions[:, 1]]
+        horizontal = start[:, 1] == end[:, 1]
+        if not numpy.all(horizontal | (start[:, 0] == end[:, 0])):
+            raise RuntimeError("(!) Error: trying to join junctions that are not properly aligned")
+        if numpy.any(numpy.all(start == end, axis=1)):
+            raise RuntimeError("(!) Error: trying to join two junctions with equal coordinates")
+        storage = LevelStorage(capacity=max(len(junction_coordinates), len(tunnel_junctions), 1))
+        storage.junction_count = len(junction_coordinates)
+        storage.junction_coordinates[:storage.junction_count] = junction_coordinates
+        storage.junction_walls[:] = ALL_WALLS
+        storage.tunnel_count = len(tunnel_junctions)
+        storage.tunnel_junctions[:storage.tunnel_count] = tunnel_junctions
+        storage.tunnel_orientations[:storage.tunnel_count] = numpy.where(horizontal, 0, 1)
+        # Directions in which tunnels leave the junctions at both of their ends
+        difference = numpy.sign(end - start)
+        direction_from = numpy.where(horizontal, numpy.where(difference[:, 0] > 0, 3, 2),
+                                     numpy.where(difference[:, 1] > 0, 1, 0))
+        direction_to = direction_from ^ 1  # Opposite direction, DIRECTIONS come in opposite pairs
+        tunnels = numpy.arange(storage.tunnel_count)
+        bits = numpy.array([WALL_BITS[direction] for direction in DIRECTIONS], dtype=numpy.uint8)
+        for ends, directions in ((tunnel_junctions[:, 0], direction_from), (tunnel_junctions[:, 1], direction_to)):
+            storage.junction_tunnels[ends, directions] = tunnels
+            numpy.bitwise_and.at(storage.junction_walls, ends, ~bits[directions])  # Break walls
+        self.layout_source = None  # Replaced, no need to load it any more
+        self._storage.invalidate()  # Old views would read the wrong elements of the new storage otherwise
+        self.storage = storage
+        self.junctions = StorageList(storage, Junction)
+        self.tunnels = StorageList(storage, Tunnel)
+        self.entry_point = None
+        self.wall_source = None
+        self.build_cell_map()
 
     def export_walls(self):
         """Exports all walls in the level
@@ -149,12 +386,97 @@ class Level:
         Returns:
             A list wall_positions where each element is (world_x, world_y, orientation)
         """
-        wall_positions = []
-        for junction in self.junctions:  # Add walls of every junction
-            wall_positions.extend(self.export_junction_walls(junction))
-        for tunnel in self.tunnels:  # Add walls of every tunnel
-            wall_positions.extend(self.export_tunnel_walls(tunnel))
-        return wall_positions
+        return self.decode_wall_table(*self.export_wall_table())
+
+    @staticmethod
+    def decode_wall_table(coordinates, orientations):
+        """Turns walls from export_wall_table() into the list returned by export_walls()"""
+        return list(zip(coordinates[:, 0].tolist(), coordinates[:, 1].tolist(),
+                        [ORIENTATIONS[orientation] for orientation in orientations.tolist()]))
+
+    def export_wall_table(self):
+        """Exports all walls in the level as arrays
+
+        Walls come in the same order as from export_walls(): walls of every junction, then of every tunnel
+
+        Returns:
+            coordinates, orientations: an array (N, 2) of world coordinates and an array (N,)
+            of indices into ORIENTATIONS
+        """
+        if self.wall_source is not None:
+            return self.wall_source.export_wall_table()
+        storage = self.storage
+        # Walls of junctions, in the order of DIRECTIONS for every junction
+        junction_cells = storage.junction_coordinates[:storage.junction_count].astype(float)
+        bits = numpy.array([WALL_BITS[direction] for direction in DIRECTIONS])
+        exists = (storage.junction_walls[:storage.junction_count, None] & bits) != 0  # (junctions, 4)
+        offsets = numpy.array([WALL_OFFSETS[direction] for direction in DIRECTIONS])
+        junction_walls = (junction_cells[:, None, :] + offsets[None, :, :2])[exists]
+        junction_orientations = numpy.broadcast_to(offsets[:, 2], exists.shape)[exists]
+        # Walls of tunnels, two for every cell between the junctions
+        cells, _, orientations = self.get_tunnel_cells()
+        horizontal = (orientations == ORIENTATIONS.index("Horizontal"))[:, None]
+        first_offset = numpy.where(horizontal, WALL_OFFSETS['up'][:2], WALL_OFFSETS['left'][:2])
+        second_offset = numpy.where(horizontal, WALL_OFFSETS['down'][:2], WALL_OFFSETS['right'][:2])
+        tunnel_walls = numpy.stack((cells + first_offset, cells + second_offset), axis=1).reshape(-1, 2)
+        tunnel_orientations = numpy.repeat(orientations, 2)
+        coordinates = numpy.concatenate((junction_walls, tunnel_walls)) * self.grid_size
+        orientations = numpy.concatenate((junction_orientations, tunnel_orientations)).astype(numpy.int8)
+        return coordinates, orientations
+
+    def get_tunnel_cells(self):
+        """Returns every grid cell inside of joined tunnels, tunnel by tunnel, from left to right or top to bottom
+
+        Returns:
+            cells, tunnels, orientations: an array (N, 2) of grid coordinates, and for every cell
+            the index of its tunnel and the tunnel's orientation (index into ORIENTATIONS)
+        """
+        storage = self.storage
+        orientations = storage.tunnel_orientations[:storage.tunnel_count]
+        joined = numpy.flatnonzero(orientations >= 0)
+        ends = storage.tunnel_junctions[joined]
+        start = storage.junction_coordinates[ends[:, 0]]
+        end = storage.junction_coordinates[ends[:, 1]]
+        first = numpy.minimum(start, end)  # Cell of the junction with smaller coordinates
+        step = numpy.abs(numpy.sign(end - start))  # Direction along the tunnel
+        lengths = numpy.abs(end - start).sum(axis=1) - 1  # Number of cells between the junctions
+        owner = numpy.repeat(numpy.arange(len(joined)), lengths)
+        position = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        cells = first[owner] + step[owner] * (position + 1)[:, None]
+        return cells, joined[owner], orientations[joined][owner]
+
+    def merge_walls(self, wall_positions):
+        """Merges collinear adjacent walls into long segments
+
+        Walls are adjacent when they lie on the same line one grid cell apart.
+        This lets the physical simulation use one shape for a whole row of walls.
+
+        Args:
+            wall_positions: A list where each element is (world_x, world_y, orientation)
+
+        Returns:
+            A list wall_segments where each element is (start_x, start_y, end_x, end_y, orientation),
+            start and end being the positions of the first and the last merged wall
+        """
+        lines = {}  # { (orientation, line coordinate): [coordinates along the line] }
+        for world_x, world_y, orientation in wall_positions:
+            if orientation == "Horizontal":
+                lines.setdefault((orientation, world_y), set()).add(world_x)
+            else:
+                lines.setdefault((orientation, world_x), set()).add(world_y)
+        wall_segments = []
+        for (orientation, line), coordinates in lines.items():
+            coordinates = sorted(coordinates)
+            start = coordinates[0]
+            for previous, current in zip(coordinates, coordinates[1:] + [None]):
+                if current is not None and current - previous == self.grid_size:
+                    continue  # Still the same segment
+                if orientation == "Horizontal":
+                    wall_segments.append((start, line, previous, line, orientation))
+                else:
+                    wall_segments.append((line, start, line, previous, orientation))
+                start = current
+        return wall_segments
 
     def export_tunnel_walls(self, tunnel):
         """Exports walls of a particular tunnel
@@ -263,53 +585,381 @@ class Level:
         """Converts world coordinates to level grid coordinates"""
         return int(world_x / self.grid_size), int(world_y / self.grid_size)
 
+    def get_cell_contents(self, world_x, world_y):
+        """Returns the Tunnel or Junction at world coordinates, or None if the cell is empty"""
+        return self.cells.get(self.world_to_grid(world_x, world_y))
+
     def get_tunnel_orientation(self, world_x, world_y):
         """Determines the orientation of the tunnel at world coordinates"""
-        grid_x, grid_y = self.world_to_grid(world_x, world_y)
-        orientation = None
-        for tunnel in self.tunnels:
-            if tunnel.includes(grid_x, grid_y):
-                orientation = tunnel.orientation
-                break
-        return orientation
+        element = self.get_cell_contents(world_x, world_y)
+        if isinstance(element, Tunnel):
+            return element.orientation
+        return None
+
+
+class LevelStorage:
+    """
+    Struct-of-arrays storage for the junctions and tunnels of a level
+
+    Junction and Tunnel objects are views into these arrays, so a level with
+    hundreds of thousands of cells does not need a dict and a list per junction.
+    Arrays grow by doubling, like Python lists do.
+    """
+    def __init__(self, capacity=16, private=False):
+        self.private = private  # Storage of a single Junction or Tunnel that is not in a level yet
+        self.junction_count = 0
+        self.junction_coordinates = numpy.zeros((capacity, 2), dtype=numpy.int32)  # (x, y) on the level grid
+        self.junction_walls = numpy.zeros(capacity, dtype=numpy.uint8)  # Bitmask of WALL_BITS
+        self.junction_tunnels = numpy.full((capacity, 4), -1, dtype=numpy.int32)  # Tunnel index for every
+                                                                                # direction in DIRECTIONS, -1 for none
+        self.tunnel_count = 0
+        self.tunnel_junctions = numpy.full((capacity, 2), -1, dtype=numpy.int32)  # Junction indices, -1 for none
+        self.tunnel_orientations = numpy.full(capacity, -1, dtype=numpy.int8)  # Index into ORIENTATIONS, -1 for none
+
+    def invalidate(self):
+        """Empties the storage for good once its level was replaced
+
+        Junctions and tunnels that still point here raise IndexError when used, instead of
+        silently reading whatever ended up at their index in the level's new storage
+        """
+        self.junction_count = 0
+        self.tunnel_count = 0
+        for name in ('junction_coordinates', 'junction_walls', 'junction_tunnels',
+                     'tunnel_junctions', 'tunnel_orientations'):
+            array = getattr(self, name)
+            setattr(self, name, numpy.empty((0,) + array.shape[1:], dtype=array.dtype))
+
+    @staticmethod
+    def grow(array, size):
+        """Returns a copy of an array with room for at least size rows"""
+        capacity = max(size, 2 * len(array))
+        grown = numpy.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def add_junction(self, x, y, walls=ALL_WALLS):
+        """Adds a junction and returns its index"""
+        index = self.junction_count
+        if index >= len(self.junction_coordinates):
+            self.junction_coordinates = self.grow(self.junction_coordinates, index + 1)
+            self.junction_walls = self.grow(self.junction_walls, index + 1)
+            self.junction_tunnels = self.grow(self.junction_tunnels, index + 1)
+        self.junction_coordinates[index] = (x, y)
+        self.junction_walls[index] = walls
+        self.junction_tunnels[index] = -1
+        self.junction_count += 1
+        return index
+
+    def add_tunnel(self):
+        """Adds a tunnel that is not joined yet and returns its index"""
+        index = self.tunnel_count
+        if index >= len(self.tunnel_junctions):
+            self.tunnel_junctions = self.grow(self.tunnel_junctions, index + 1)
+            self.tunnel_orientations = self.grow(self.tunnel_orientations, index + 1)
+        self.tunnel_junctions[index] = -1
+        self.tunnel_orientations[index] = -1
+        self.tunnel_count += 1
+        return index
+
+    def adopt(self, element):
+        """Moves a Junction or an unjoined Tunnel that is not in a level yet into this storage
+
+        Does nothing if the element is already stored here
+
+        Raises:
+            RuntimeError: If the element belongs to another level or is a joined tunnel
+        """
+        if element.storage is self:
+            return
+        storage = element.storage
+        if not storage.private:
+            raise RuntimeError("(!) Error: junctions and tunnels of different levels can not be mixed")
+        if isinstance(element, Junction):
+            x, y = storage.junction_coordinates[element.index]
+            element.index = self.add_junction(x, y, storage.junction_walls[element.index])
+        else:
+            if storage.tunnel_orientations[element.index] >= 0:
+                raise RuntimeError("(!) Error: a joined tunnel can not be moved to another level")
+            element.index = self.add_tunnel()
+        element.storage = self
+
+
+class StorageList:
+    """
+    List of the junctions or tunnels in a LevelStorage
+
+    Views are created on access, appending a new Junction or Tunnel moves it into the storage
+    """
+    __slots__ = ('storage', 'view')
+
+    def __init__(self, storage, view):
+        self.storage = storage
+        self.view = view  # Junction or Tunnel
+
+    def __len__(self):
+        if self.view is Junction:
+            return self.storage.junction_count
+        return self.storage.tunnel_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("(!) Error: level element index out of range")
+        return self.view.at(self.storage, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.view.at(self.storage, index)
+
+    def append(self, element):
+        """Adds a new Junction or Tunnel to the level"""
+        if not isinstance(element, self.view):
+            raise TypeError("(!) Error: adding an element of the wrong type to a level")
+        self.storage.adopt(element)
+
+
+class CellMap:
+    """
+    Dictionary-like map { (grid_x, grid_y): Tunnel or Junction } of the occupied cells of a level
+
+    Backed by a dense int32 grid that covers every occupied cell: 0 for an empty cell,
+    index + 1 of a junction or -(index + 1) of a tunnel in the level's storage. Views are
+    created on access, so a big level does not need a tuple and a view per cell.
+    The grid grows by doubling when a cell outside of it is occupied.
+    """
+    __slots__ = ('storage', 'grid', 'left', 'top')
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.grid = numpy.zeros((0, 0), dtype=numpy.int32)  # Row per grid y, column per grid x
+        self.left = 0  # Grid coordinates of grid[0, 0]
+        self.top = 0
+
+    @staticmethod
+    def encode(element):
+        """Returns the code of a Junction or a Tunnel in the grid
+
+        Raises:
+            TypeError: If element is not a Junction or a Tunnel
+        """
+        if isinstance(element, Junction):
+            return element.index + 1
+        if isinstance(element, Tunnel):
+            return -element.index - 1
+        raise TypeError("(!) Error: only junctions and tunnels can occupy level cells")
+
+    def decode(self, code):
+        """Returns the view of a code from the grid, None for 0"""
+        if code > 0:
+            return Junction.at(self.storage, code - 1)
+        if code < 0:
+            return Tunnel.at(self.storage, -code - 1)
+        return None
+
+    def include(self, left, top, right, bottom):
+        """Grows the grid to cover a rectangle of grid cells, bounds included"""
+        height, width = self.grid.shape
+        grid_right = self.left + width - 1
+        grid_bottom = self.top + height - 1
+        if width and left >= self.left and top >= self.top and right <= grid_right and bottom <= grid_bottom:
+            return
+        if width:  # Grow at least twice as big, so occupying cells one at a time stays linear
+            left = min(left, self.left - width) if left < self.left else self.left
+            top = min(top, self.top - height) if top < self.top else self.top
+            right = max(right, grid_right + width) if right > grid_right else grid_right
+            bottom = max(bottom, grid_bottom + height) if bottom > grid_bottom else grid_bottom
+        grid = numpy.zeros((bottom - top + 1, right - left + 1), dtype=numpy.int32)
+        grid[self.top - top:self.top - top + height, self.left - left:self.left - left + width] = self.grid
+        self.grid, self.left, self.top = grid, left, top
+
+    def fill(self, cells, codes):
+        """Occupies many cells at once
+
+        Args:
+            cells: array (N, 2) of grid coordinates
+            codes: array (N,) of codes, see encode()
+        """
+        if not len(cells):
+            return
+        low = cells.min(axis=0)
+        high = cells.max(axis=0)
+        self.include(int(low[0]), int(low[1]), int(high[0]), int(high[1]))
+        self.grid[cells[:, 1] - self.top, cells[:, 0] - self.left] = codes
+
+    def occupy(self, left, top, right, bottom, element):
+        """Puts a Junction or a Tunnel into a rectangle of grid cells, bounds included
+
+        Raises:
+            TypeError: If element is not a Junction or a Tunnel
+            RuntimeError: If element belongs to another level
+        """
+        code = self.encode(element)
+        if element.storage is not self.storage:
+            raise RuntimeError("(!) Error: junctions and tunnels of different levels can not be mixed")
+        self.include(left, top, right, bottom)
+        self.grid[top - self.top:bottom - self.top + 1, left - self.left:right - self.left + 1] = code
+
+    def get_code(self, grid_x, grid_y):
+        """Returns the code of a cell, 0 if it is empty"""
+        x = grid_x - self.left
+        y = grid_y - self.top
+        height, width = self.grid.shape
+        if 0 <= x < width and 0 <= y < height:
+            return int(self.grid[y, x])
+        return 0
+
+    def get(self, cell, default=None):
+        """Returns the Tunnel or Junction in a cell, default if the cell is empty"""
+        code = self.get_code(*cell)
+        return default if code == 0 else self.decode(code)
+
+    def __getitem__(self, cell):
+        code = self.get_code(*cell)
+        if code == 0:
+            raise KeyError(cell)
+        return self.decode(code)
+
+    def __setitem__(self, cell, element):
+        grid_x, grid_y = cell
+        self.occupy(grid_x, grid_y, grid_x, grid_y, element)
+
+    def __contains__(self, cell):
+        return self.get_code(*cell) != 0
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self.grid))
+
+    def __iter__(self):
+        for y, x in numpy.argwhere(self.grid).tolist():
+            yield x + self.left, y + self.top
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(cell, self[cell]) for cell in self]
+
+
+class WallsView:
+    """
+    Dictionary-like view of a junction's walls: { 'up': True, 'down': True, 'left': True, 'right': True }
+    """
+    __slots__ = ('storage', 'index')
+
+    def __init__(self, storage, index):
+        self.storage = storage
+        self.index = index
+
+    def __getitem__(self, direction):
+        return bool(self.storage.junction_walls[self.index] & WALL_BITS[direction])
+
+    def __setitem__(self, direction, exists):
+        if exists:
+            self.storage.junction_walls[self.index] |= WALL_BITS[direction]
+        else:
+            self.storage.junction_walls[self.index] &= ~WALL_BITS[direction] & ALL_WALLS
+
+    def __iter__(self):
+        return iter(DIRECTIONS)
+
+    def keys(self):
+        return list(DIRECTIONS)
+
+    def items(self):
+        return [(direction, self[direction]) for direction in DIRECTIONS]
 
 
 class Tunnel:
     """
     A straight tunnel between two junctions
+
+    A view into a LevelStorage, a new Tunnel has a private storage until it is added to a level
     """
+    __slots__ = ('storage', 'index')
+
     def __init__(self):
-        self.junctions = [None, None]  # Two adjacent junctions
-        self.orientation = None        # If the tunnel is horizontal or vertical
+        self.storage = LevelStorage(capacity=1, private=True)
+        self.index = self.storage.add_tunnel()
+
+    @classmethod
+    def at(cls, storage, index):
+        """Returns a view of a tunnel that is already stored"""
+        tunnel = cls.__new__(cls)
+        tunnel.storage = storage
+        tunnel.index = index
+        return tunnel
+
+    def __eq__(self, other):
+        return isinstance(other, Tunnel) and self.storage is other.storage and self.index == other.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.storage), self.index, 'tunnel'))
+
+    @property
+    def junctions(self):
+        """Two adjacent junctions (None if the tunnel is not joined)"""
+        return [Junction.at(self.storage, index) if index >= 0 else None
+                for index in self.storage.tunnel_junctions[self.index].tolist()]
+
+    @property
+    def orientation(self):
+        """If the tunnel is "Horizontal" or "Vertical", None if it is not joined"""
+        code = self.storage.tunnel_orientations[self.index]
+        return ORIENTATIONS[code] if code >= 0 else None
+
+    @orientation.setter
+    def orientation(self, orientation):
+        self.storage.tunnel_orientations[self.index] = ORIENTATIONS.index(orientation) if orientation else -1
+
+    def set_junctions(self, junction_from, junction_to):
+        """Sets the two junctions at the ends of the tunnel (they must be in the tunnel's storage)"""
+        self.storage.tunnel_junctions[self.index] = (junction_from.index, junction_to.index)
+
+    def get_ends(self):
+        """Returns grid coordinates of both junctions: x0, y0, x1, y1"""
+        index_from, index_to = self.storage.tunnel_junctions[self.index].tolist()
+        coordinates = self.storage.junction_coordinates
+        return tuple(coordinates[index_from].tolist() + coordinates[index_to].tolist())
 
     def get_left_bound(self):
         """Returns the left bound of the tunnel in level coordinates"""
         # Bounds DO NOT include junctions
+        x0, y0, x1, y1 = self.get_ends()
         if self.orientation is "Vertical":
-            return self.junctions[0].x
+            return x0
         elif self.orientation is "Horizontal":
-            return min(self.junctions[0].x, self.junctions[1].x)+1
+            return min(x0, x1)+1
 
     def get_right_bound(self):
         """Returns the right bound of the tunnel in level coordinates"""
+        x0, y0, x1, y1 = self.get_ends()
         if self.orientation is "Vertical":
-            return self.junctions[0].x
+            return x0
         elif self.orientation is "Horizontal":
-            return max(self.junctions[0].x, self.junctions[1].x)-1
+            return max(x0, x1)-1
 
     def get_top_bound(self):
         """Returns the top bound of the tunnel in level coordinates"""
+        x0, y0, x1, y1 = self.get_ends()
         if self.orientation is "Horizontal":
-            return self.junctions[0].y
+            return y0
         elif self.orientation is "Vertical":
-            return min(self.junctions[0].y, self.junctions[1].y)+1
+            return min(y0, y1)+1
 
     def get_bottom_bound(self):
         """Returns the bottom bound of the tunnel in level coordinates"""
+        x0, y0, x1, y1 = self.get_ends()
         if self.orientation is "Horizontal":
-            return self.junctions[0].y
+            return y0
         elif self.orientation is "Vertical":
-            return max(self.junctions[0].y, self.junctions[1].y)-1
+            return max(y0, y1)-1
 
     def includes(self, grid_x, grid_y):
         """Checks if the tunnel includes a particular grid cell"""
@@ -320,9 +970,61 @@ class Tunnel:
 class Junction:
     """
     A place where two or more tunnels meet
+
+    A view into a LevelStorage, a new Junction has a private storage until it is added to a level
     """
+    __slots__ = ('storage', 'index')
+
     def __init__(self, x=0, y=0):
-        self.x = x  # Location on the level grid
-        self.y = y
-        self.tunnels = []  # Two to four adjacent tunnels
-        self.walls = { 'up': True, 'down': True, 'left': True, 'right': True }  # Walls forming the junction
+        self.storage = LevelStorage(capacity=1, private=True)
+        self.index = self.storage.add_junction(x, y)  # Location on the level grid, all four walls
+
+    @classmethod
+    def at(cls, storage, index):
+        """Returns a view of a junction that is already stored"""
+        junction = cls.__new__(cls)
+        junction.storage = storage
+        junction.index = index
+        return junction
+
+    def __eq__(self, other):
+        return isinstance(other, Junction) and self.storage is other.storage and self.index == other.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.storage), self.index, 'junction'))
+
+    @property
+    def x(self):
+        """Location on the level grid"""
+        return int(self.storage.junction_coordinates[self.index, 0])
+
+    @x.setter
+    def x(self, x):
+        self.storage.junction_coordinates[self.index, 0] = x
+
+    @property
+    def y(self):
+        """Location on the level grid"""
+        return int(self.storage.junction_coordinates[self.index, 1])
+
+    @y.setter
+    def y(self, y):
+        self.storage.junction_coordinates[self.index, 1] = y
+
+    @property
+    def walls(self):
+        """Walls forming the junction, { 'up': True, 'down': True, 'left': True, 'right': True }"""
+        return WallsView(self.storage, self.index)
+
+    @property
+    def tunnels(self):
+        """Two to four adjacent tunnels"""
+        return [Tunnel.at(self.storage, index)
+                for index in self.storage.junction_tunnels[self.index].tolist() if index >= 0]
+
+    def add_tunnel(self, tunnel, direction):
+        """Connects a tunnel that leaves the junction in a direction ('up', 'down', 'left', 'right')"""
+        self.storage.junction_tunnels[self.index, DIRECTIONS.index(direction)] = tunnel.index
@@ -0,0 +1,171 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import argparse
+    import mmap
+    import numpy
+    import struct
+    import time  # Need this for time.perf_counter()
+    import sys
+    from level import Level, ORIENTATIONS
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+# Binary level format, all numbers are little endian:
+#   header (see HEADER)
+#   junctions:  int32[junction_count][2]  grid coordinates (x, y)
+#   tunnels:    int32[tunnel_count][2]    indices of the junctions a tunnel goes from and to
+#   walls:      float32[wall_count][2]    world coordinates of every wall (x, y)
+#   walls:      uint8[wall_count]         orientation of every wall, index into ORIENTATIONS
+# Every section starts at a multiple of 4 bytes, so it can be used straight from a memory map
+MAGIC = b'SDLV'
+VERSION = 1
+HEADER = struct.Struct('<4sHbbIIIIi')  # magic, version, entry direction, padding, grid size,
+                                       # junction count, tunnel count, wall count, entry junction
+DIRECTIONS = ('up', 'right', 'down', 'left')  # Entry direction codes
+
+
+def align(offset):
+    """Rounds an offset up to a multiple of 4 bytes"""
+    return (offset + 3) & ~3
+
+
+def save_level(level, path):
+    """Saves a level to a binary file
+
+    Walls are exported and stored as well, so loading the level does not need to generate them
+
+    Args:
+        level: Level to save
+        path: path to the file
+    """
+    storage = level.storage
+    junctions = storage.junction_coordinates[:storage.junction_count].astype('<i4')
+    tunnels = storage.tunnel_junctions[:storage.tunnel_count]
+    tunnels = tunnels[storage.tunnel_orientations[:storage.tunnel_count] >= 0].astype('<i4')  # Joined only
+    wall_coordinates, wall_orientations = level.export_wall_table()
+    wall_coordinates = wall_coordinates.astype('<f4')
+    wall_orientations = wall_orientations.astype('u1')
+    entry_direction = DIRECTIONS.index(level.entry_direction) if level.entry_direction is not None else -1
+    entry_junction = level.entry_point.index if level.entry_point is not None else -1
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, entry_direction, 0, int(level.grid_size),
+                               len(junctions), len(tunnels), len(wall_orientations), entry_junction))
+        for section in (junctions, tunnels, wall_coordinates, wall_orientations):
+            file.write(section.tobytes())
+            file.write(b'\0' * (align(file.tell()) - file.tell()))
+
+
+class LevelFile:
+    """
+    A level file mapped into memory
+
+    Nothing is decoded up front. The sections are NumPy arrays that read straight
+    from the memory map and are only created when they are used, so opening even a
+    huge level is instant and several processes that open the same file share one
+    copy of it.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("(!) Error: {} is not a level file".format(path))
+        (magic, version, entry_direction, _, self.grid_size, junction_count, tunnel_count,
+         wall_count, self.entry_junction) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("(!) Error: {} is not a level file".format(path))
+        if version != VERSION:
+            raise ValueError("(!) Error: level file version {} is not supported".format(version))
+        self.entry_direction = DIRECTIONS[entry_direction] if entry_direction >= 0 else None
+        self.sections = {}  # { name: (offset, dtype, shape) } of every section in the file
+        offset = HEADER.size
+        for name, dtype, shape in (('junctions', '<i4', (junction_count, 2)),
+                                   ('tunnels', '<i4', (tunnel_count, 2)),
+                                   ('wall_coordinates', '<f4', (wall_count, 2)),
+                                   ('wall_orientations', 'u1', (wall_count,))):
+            offset = align(offset)
+            self.sections[name] = offset, dtype, shape
+            offset += numpy.dtype(dtype).itemsize * int(numpy.prod(shape))
+        if offset > len(self.map):  # Checked before mapping anything, NumPy would refuse a short buffer
+            raise ValueError("(!) Error: level file {} is truncated".format(path))
+
+    def map_section(self, name):
+        """Returns an array that reads a section of the file"""
+        offset, dtype, shape = self.sections[name]
+        return numpy.frombuffer(self.map, dtype=dtype, count=int(numpy.prod(shape)), offset=offset).reshape(shape)
+
+    @property
+    def junctions(self):
+        """Array (N, 2) of grid coordinates of junctions"""
+        return self.map_section('junctions')
+
+    @property
+    def tunnels(self):
+        """Array (M, 2) of indices of the junctions every tunnel goes from and to"""
+        return self.map_section('tunnels')
+
+    def export_wall_table(self):
+        """Returns the stored walls as arrays that read from the file, like Level.export_wall_table()"""
+        return self.map_section('wall_coordinates'), self.map_section('wall_orientations')
+
+    def load_layout(self, level):
+        """Decodes the junctions and tunnels into a level, see Level.load_layout()"""
+        level.load_arrays(self.junctions, self.tunnels)
+        if self.entry_junction >= 0:
+            level.entry_point = level.junctions[self.entry_junction]
+        level.wall_source = self  # Walls are read from the file
+
+    def to_level(self):
+        """Builds a Level from the file
+
+        The level uses the stored walls instead of generating them again. Junctions and
+        tunnels are only decoded once something uses them, e.g. the router or the player's spawn
+        """
+        level = Level()
+        level.grid_size = self.grid_size
+        level.entry_direction = self.entry_direction
+        level.wall_source = self
+        level.layout_source = self
+        return level
+
+
+def load_level(path):
+    """Loads a level saved with save_level()"""
+    return LevelFile(path).to_level()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a maze and saves it as a level file")
+    parser.add_argument('path', help="file to save the level to")
+    parser.add_argument('--maze', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'), default=(10, 10),
+                        help="number of junctions in the maze")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the maze")
+    args = parser.parse_args()
+    level = Level()
+    level.generate_maze(args.maze[0], args.maze[1], seed=args.seed)
+    save_level(level, args.path)
+    start = time.perf_counter()
+    load_level(args.path).load_layout()
+    print("(+) Saved {} junctions and {} tunnels, loading takes {:.3f} s".format(
+        len(level.junctions), len(level.tunnels), time.perf_counter() - start))
+
+if __name__ == '__main__': main()
@@ -0,0 +1,118 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import time  # Need this for time.perf_counter()
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    from assets import AssetCache
+    from level import Level
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+def prepare_level(level=None, maze=None, seed=None):
+    """Generates a level if needed and exports its walls, safe to call from a worker thread
+
+    Args:
+        level: Level to prepare, None to generate one
+        maze: (width, height) of a maze to generate in junctions, None for the test level
+        seed: seed of the generated maze
+
+    Returns:
+        level, wall_table: the Level and its walls from Level.export_wall_table()
+    """
+    if level is None:
+        level = Level()
+        if maze is None:
+            level.generate_test_level()
+        else:
+            level.generate_maze(maze[0], maze[1], seed=seed)
+    return level, level.export_wall_table()
+
+
+class Loader:
+    """
+    Runs loading jobs on worker threads while the main thread keeps drawing
+
+    Jobs must not touch the display or add anything to the physical simulation,
+    they only produce data (decoded images, levels, wall tables, walls) that the
+    main thread hands to the game once the jobs are done.
+    """
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loader")
+        self.jobs = {}  # { name: future }
+        self.fractions = {}  # { name: fraction } of jobs that report their own progress
+        self.start_time = time.perf_counter()
+        self.finish_time = None  # When the last job finished
+
+    def submit(self, name, function, *args, **kwargs):
+        """Starts a job, its result is returned by get_result(name)"""
+        self.jobs[name] = self.executor.submit(function, *args, **kwargs)
+        self.finish_time = None
+
+    def load_image(self, image_dir):
+        """Starts decoding an image, get_result(image_dir) returns the decoded surface"""
+        self.submit(image_dir, AssetCache.decode, image_dir)
+
+    def report(self, name):
+        """Returns a function that a job calls with its own progress from 0 to 1"""
+        def set_fraction(fraction):
+            self.fractions[name] = fraction
+        return set_fraction
+
+    def get_progress(self, names=None):
+        """Returns the fraction of finished jobs, from 0 to 1, counting the progress that jobs report
+
+        Args:
+            names: names of the jobs to count, None for all jobs
+        """
+        names = list(self.jobs.keys()) if names is None else names
+        if not names:
+            return 1.0
+        return sum(1.0 if self.jobs[name].done() else self.fractions.get(name, 0.0)
+                   for name in names) / len(names)
+
+    def is_done(self):
+        """Returns True once every job has finished"""
+        if all(job.done() for job in self.jobs.values()):
+            if self.finish_time is None:
+                self.finish_time = time.perf_counter()
+            return True
+        return False
+
+    def get_result(self, name):
+        """Waits for a job and returns its result
+
+        Raises:
+            Whatever the job raised
+        """
+        return self.jobs[name].result()
+
+    def get_load_time(self):
+        """Returns seconds from the start until the last job finished, None if still loading"""
+        if not self.is_done():
+            return None
+        return self.finish_time - self.start_time
+
+    def shutdown(self):
+        """Stops the worker threads once their jobs are finished"""
+        self.executor.shutdown(wait=True)
@@ -19,6 +19,7 @@
 """
 
 try:
+    import argparse
     import sys
     from game import Game
 except ImportError as exc:
@@ -27,7 +28,32 @@ except ImportError as exc:
 
 
 def main():
-    game = Game()
+    parser = argparse.ArgumentParser(description="space-delivery-game")
+    parser.add_argument('--record', metavar='FILE', help="record input to a file")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="replay recorded input as fast as possible and print frame times")
+    parser.add_argument('--profile-csv', metavar='FILE', help="write timings of every frame to a CSV file")
+    parser.add_argument('--headless', action='store_true', help="run without showing a window")
+    parser.add_argument('--physics-thread', action='store_true', help="run physics on a separate thread")
+    parser.add_argument('--maze', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="play a generated maze of this many junctions instead of the test level")
+    parser.add_argument('--seed', type=int, help="seed of the generated maze")
+    parser.add_argument('--resolution', type=int, nargs=2, default=(1920, 1080), metavar=('WIDTH', 'HEIGHT'),
+                        help="size of the window")
+    parser.add_argument('--fixed-resolution', action='store_true',
+                        help="always render at the window's resolution, even when frames take too long")
+    parser.add_argument('--compositing', action='store_true',
+                        help="while the camera turns, draw the world unrotated and rotate the whole frame once")
+    parser.add_argument('--stream-radius', type=int, metavar='CELLS',
+                        help="only keep walls within this many grid cells of a car in the physical simulation")
+    parser.add_argument('--stream-chunk-cells', type=int, default=4, metavar='CELLS',
+                        help="stream walls in square chunks of this many grid cells")
+    args = parser.parse_args()
+    game = Game(headless=args.headless, profile_csv=args.profile_csv, physics_thread=args.physics_thread,
+                record=args.record, replay=args.replay, maze=args.maze, seed=args.seed,
+                resolution=args.resolution, dynamic_resolution=not args.fixed_resolution,
+                compositing=args.compositing, stream_radius=args.stream_radius,
+                stream_chunk_cells=args.stream_chunk_cells)
     game.run()
 
 if __name__ == '__main__': main()
\ No newline at end of file
@@ -30,17 +30,102 @@ class Physics:
     """
     A handler for all physics in the game
     """
-    def __init__(self):
+    def __init__(self, fixed_step=None, max_substeps=8, force_scale=0.5):
         self.space = pymunk.Space()  # Create a Space which contains the simulation
         self.space.gravity = 0, 0    # Set its gravity
         self.space.damping = 0.8     # How quickly things lose velocity
+        self.fixed_step = fixed_step      # Seconds per step, None to split each frame into two steps
+        self.max_substeps = max_substeps  # Most steps per frame, the rest of a long frame is dropped
+        self.accumulator = 0.0            # Time that has passed but was not simulated yet
+        self.alpha = 1.0                  # How far between the last two steps the rendered state is
+        self.collidables = []             # Dynamic collidables, their transforms are interpolated
+        self.step_count = 0               # Number of steps simulated so far
+        self.interpolation = True         # Set render transforms of collidables after every update
+        # Fraction of a frame that forces act for with a fixed step. Chipmunk clears forces after every
+        # step, so with two steps per frame forces only act during the first half of the frame; 0.5
+        # gives the same handling as that, 1.0 lets forces act for the whole frame
+        self.force_scale = force_scale
+        self.impulses = {}                # { body: (impulse, angular impulse) } not yet used by a step
 
     def update(self, time_delta):
         """Updates the entire simulation"""
-        dt = time_delta / 2.0
-        for x in range(2):
-            self.space.step(dt)  # make two updates per frame for better stability
+        if self.fixed_step is None:
+            dt = time_delta / 2.0
+            for x in range(2):
+                self.space.step(dt)  # make two updates per frame for better stability
+            self.step_count += 2
+            return
+        self.accumulator += time_delta
+        # Forces applied this frame become impulses, so frames too short for a step do not lose them
+        for collidable in self.collidables:
+            body = collidable.body
+            impulse, angular_impulse = self.impulses.get(body, ((0.0, 0.0), 0.0))
+            scale = time_delta * self.force_scale
+            self.impulses[body] = ((impulse[0] + body.force.x * scale, impulse[1] + body.force.y * scale),
+                                   angular_impulse + body.torque * scale)
+            body.force = 0, 0  # Forces are applied anew every frame
+            body.torque = 0
+        steps = 0
+        remaining = self.accumulator
+        while remaining >= self.fixed_step and steps < self.max_substeps:  # Count the steps of this frame
+            remaining -= self.fixed_step
+            steps += 1
+        if steps:
+            duration = steps * self.fixed_step  # Pending impulses are spread evenly over this frame's steps
+            forces = [self.impulses.pop(collidable.body, ((0.0, 0.0), 0.0)) for collidable in self.collidables]
+            for _ in range(steps):
+                for collidable, ((impulse_x, impulse_y), angular_impulse) in zip(self.collidables, forces):
+                    collidable.save_state()
+                    collidable.body.force = impulse_x / duration, impulse_y / duration
+                    collidable.body.torque = angular_impulse / duration
+                self.space.step(self.fixed_step)
+                self.accumulator -= self.fixed_step
+        self.step_count += steps
+        if self.accumulator >= self.fixed_step:  # Too far behind, do not try to catch up
+            self.accumulator %= self.fixed_step
+        self.alpha = self.accumulator / self.fixed_step
+        if not self.interpolation:  # Someone else decides what is drawn
+            return
+        for collidable in self.collidables:
+            collidable.interpolate(self.alpha)
 
     def add_collidable(self, collidable):
         """Adds a collidable to the physical simulation"""
         self.space.add(collidable.body, collidable.shape)
+        if collidable.body.body_type == pymunk.Body.DYNAMIC:
+            self.collidables.append(collidable)
+
+    def remove_collidable(self, collidable):
+        """Removes a collidable from the physical simulation, along with impulses it has not used yet"""
+        self.space.remove(collidable.body, collidable.shape)
+        if collidable in self.collidables:
+            self.collidables.remove(collidable)
+        self.impulses.pop(collidable.body, None)
+
+    def add_wall_segment(self, start, end, length, thickness, orientation):
+        """Adds a straight wall made of several walls merged together
+
+        The wall is a box attached to the space's static body
+
+        Args:
+            start: world coordinates of the first merged wall's center
+            end: world coordinates of the last merged wall's center
+            length: length of a single wall
+            thickness: thickness of a single wall
+            orientation: "Horizontal" or "Vertical"
+
+        Returns:
+            The shape that was added to the simulation
+        """
+        if orientation == "Horizontal":
+            left, right = start[0] - length / 2, end[0] + length / 2
+            top, bottom = start[1] - thickness / 2, start[1] + thickness / 2
+        elif orientation == "Vertical":
+            left, right = start[0] - thickness / 2, start[0] + thickness / 2
+            top, bottom = start[1] - length / 2, end[1] + length / 2
+        else:
+            raise ValueError("(!) Error: wall orientation is invalid")
+        shape = pymunk.Poly(self.space.static_body, [(left, top), (right, top), (right, bottom), (left, bottom)],
+                            radius=0.01)
+        self.space.add(shape)
+        return shape
@@ -103,7 +103,9 @@ class Player:
     def place_in_world(self, world):
         """Places player at the level's spawn"""
         self.level = world.level  # Save reference to the level
-        self.car.place(*(self.level.get_player_spawn()))  # Place car at the spawn
+        world_x, world_y, spawn_angle = self.level.get_player_spawn()
+        self.car.place(world_x, world_y, spawn_angle)  # Place car at the spawn
+        self.change_movement_direction(spawn_angle)  # Keep the alignment spring from turning the car back
         world.physics.space.add(self.alignment_spring_pivot, self.alignment_spring)  # Add spring
         world.add_collidable(self.car)  # Add the car to the world
 
@@ -113,7 +115,7 @@ class Player:
         Returns:
             "Horizontal", "Vertical" or None
         """
-        return self.level.get_tunnel_orientation(*(self.car.get_position()))
+        return self.level.get_tunnel_orientation(*(self.car.get_render_position()))
 
     def get_data_for_camera(self):
         """Returns coordinates for the camera to follow
@@ -121,8 +123,8 @@ class Player:
         Returns:
             world_x, world_y, cam_angle: cam_angle can be None (no camera rotation required)
         """
-        world_x = self.car.get_position().x  # TEMP
-        world_y = self.car.get_position().y
+        world_x = self.car.get_render_position().x  # TEMP
+        world_y = self.car.get_render_position().y
         cam_angle = None
         car_angle = self.get_car_angle()
         tunnel_orientation = self.determine_tunnel_orientation()
@@ -140,4 +142,4 @@ class Player:
 
     def get_car_angle(self):
         """Returns car angle in degrees [0,359]"""
-        return int(math.degrees(self.car.body.angle)) % 360
\ No newline at end of file
+        return int(math.degrees(self.car.get_render_angle())) % 360
\ No newline at end of file
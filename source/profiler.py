@@ -0,0 +1,187 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import pygame  # Need this for pygame.font
+    import csv
+    import numpy
+    import time  # Need this for time.perf_counter()
+    import sys
+    from collections import deque
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class FrameProfiler:
+    """
+    Measures how long every frame and every part of a frame takes
+
+    Usage:
+        profiler.begin_frame()
+        with profiler.section('render'):
+            ...
+        profiler.end_frame()
+
+    Times of the same section are added up within a frame, so a section can be
+    entered many times per frame (e.g. once per drawn sprite).
+
+    With csv_path set, timings of every frame are written to a CSV file in batches
+    of batch_size frames, one row per section of a frame (times in milliseconds).
+    Call close() at the end to write the last batch.
+    """
+    def __init__(self, enabled=True, history=600, csv_path=None, batch_size=256):
+        self.enabled = enabled          # A disabled profiler measures nothing
+        self.frame_times = deque(maxlen=history)  # Recent frame times in seconds
+        self.section_times = {}         # { section name: deque of recent times in seconds }
+        self.history = history
+        self.csv_file = None            # File that timings of every frame are written to
+        self.csv_writer = None
+        if csv_path is not None:
+            self.csv_file = open(csv_path, 'w', newline='')
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(['frame', 'section', 'time'])
+        self.batch_size = batch_size    # Frames of CSV rows kept before they are written
+        self.rows = []                  # CSV rows not written yet
+        self.frame_count = 0
+        self.current = {}               # Section times of the frame in progress
+        self.frame_start = None
+        self.show_overlay = False       # Draw timings on top of the game
+        self.font = None
+        self.null_section = NullSection()
+
+    def begin_frame(self):
+        """Starts measuring a new frame"""
+        if not self.enabled:
+            return
+        self.current = {}
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """Finishes measuring the frame started with begin_frame()"""
+        if not self.enabled or self.frame_start is None:
+            return
+        frame_time = time.perf_counter() - self.frame_start
+        self.frame_start = None
+        self.frame_times.append(frame_time)
+        for name, duration in self.current.items():
+            if name not in self.section_times:
+                self.section_times[name] = deque(maxlen=self.history)
+            self.section_times[name].append(duration)
+        if self.csv_writer is not None:
+            self.rows.append((self.frame_count, 'frame', '{:.3f}'.format(frame_time * 1000)))
+            self.rows.extend((self.frame_count, name, '{:.3f}'.format(duration * 1000))
+                             for name, duration in sorted(self.current.items()))
+            if (self.frame_count + 1) % self.batch_size == 0:
+                self.flush_csv()
+        self.frame_count += 1
+
+    def section(self, name):
+        """Returns a context manager that measures a part of the frame"""
+        if not self.enabled:
+            return self.null_section
+        return ProfilerSection(self, name)
+
+    def add_time(self, name, duration):
+        """Adds time(in seconds) to a section of the current frame"""
+        self.current[name] = self.current.get(name, 0.0) + duration
+
+    def get_frame_percentiles(self):
+        """Returns p50, p95 and p99 of recent frame times in seconds (nearest rank)"""
+        if not self.frame_times:
+            return 0.0, 0.0, 0.0
+        p50, p95, p99 = numpy.percentile(self.frame_times, (50, 95, 99), method='nearest').tolist()
+        return p50, p95, p99
+
+    def get_section_averages(self):
+        """Returns { section name: average time in seconds } over recent frames"""
+        return {name: sum(times) / len(times) for name, times in self.section_times.items() if times}
+
+    def flush_csv(self):
+        """Writes the CSV rows that were not written yet"""
+        if self.csv_writer is None:
+            return
+        self.csv_writer.writerows(self.rows)
+        self.rows = []
+        self.csv_file.flush()
+
+    def close(self):
+        """Writes the remaining CSV rows and closes the CSV file"""
+        if self.csv_file is None:
+            return
+        self.flush_csv()
+        self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+
+    def get_summary(self):
+        """Returns lines of text that describe recent timings"""
+        p50, p95, p99 = self.get_frame_percentiles()
+        lines = ["frame p50 {:.2f} ms  p95 {:.2f} ms  p99 {:.2f} ms".format(p50 * 1000, p95 * 1000, p99 * 1000)]
+        for name, average in sorted(self.get_section_averages().items()):
+            lines.append("{}: {:.2f} ms".format(name, average * 1000))
+        return lines
+
+    def draw_overlay(self, surface):
+        """Draws recent timings in the top left corner of a surface
+
+        Returns:
+            The area that was drawn on, None if nothing was drawn
+        """
+        if not self.enabled or not self.show_overlay:
+            return None
+        if self.font is None:
+            self.font = pygame.font.SysFont(None, 24)
+        y = 10
+        area = pygame.Rect(10, 10, 0, 0)
+        for line in self.get_summary():
+            text = self.font.render(line, True, (255, 255, 255), (0, 0, 0))
+            area.union_ip(surface.blit(text, (10, y)))
+            y += text.get_height()
+        return area
+
+
+class ProfilerSection:
+    """
+    Context manager that adds the time spent inside it to a profiler section
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullSection:
+    """
+    Context manager that does nothing, used by disabled profilers
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
@@ -0,0 +1,74 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+
+class ResolutionScaler:
+    """
+    Picks the internal render resolution that keeps frame times within a budget
+
+    Frame times are smoothed over a few frames. While they are over the budget the
+    scale goes down one step, once there is enough headroom it goes back up. Scales
+    are multiples of step, so only a handful of scaled sprites and chunks are ever
+    cached. After every change the scaler waits a while, so the new scale can show
+    its effect before the next decision.
+    """
+    def __init__(self, target_frame_time, min_scale=0.5, max_scale=1.0, step=0.125,
+                 smoothing=0.1, headroom=0.7, cooldown=30):
+        self.target_frame_time = target_frame_time  # Budget for the work of one frame in seconds
+        self.min_scale = min_scale  # Lowest fraction of the window resolution that is rendered
+        self.max_scale = max_scale
+        self.step = step            # Scales change by this much at a time
+        self.smoothing = smoothing  # Weight of the newest frame in the average frame time
+        self.headroom = headroom    # Scale up once frames take less than this fraction of the budget
+        self.cooldown = cooldown    # Frames to wait after a change before changing again
+        self.scale = max_scale      # Current scale
+        self.average = None         # Smoothed frame time in seconds, None right after a change
+        self.frames_left = cooldown  # Frames until the next change is allowed
+
+    def quantize(self, scale):
+        """Rounds a scale to a multiple of step within the allowed range"""
+        scale = round(scale / self.step) * self.step
+        return min(max(scale, self.min_scale), self.max_scale)
+
+    def update(self, frame_time):
+        """Takes the time the last frame took to produce (without waiting for the frame rate cap)
+
+        Returns:
+            The scale to render the next frame at
+        """
+        frame_time = min(frame_time, self.target_frame_time * 2)  # A single hitch should not decide alone
+        if self.average is None:
+            self.average = frame_time
+        else:
+            self.average += (frame_time - self.average) * self.smoothing
+        if self.frames_left > 0:
+            self.frames_left -= 1
+            return self.scale
+        if self.average > self.target_frame_time:
+            scale = self.quantize(self.scale - self.step)
+        elif self.average < self.target_frame_time * self.headroom:
+            scale = self.quantize(self.scale + self.step)
+        else:
+            scale = self.scale
+        if scale != self.scale:
+            self.scale = scale
+            self.average = None
+            self.frames_left = self.cooldown
+        return self.scale
@@ -0,0 +1,87 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import pygame  # Need this for pygame.transform.rotate()
+    import sys
+    from collections import OrderedDict
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class RotationCache:
+    """
+    Cache of rotated sprites keyed by (sprite, quantized angle, scale)
+
+    Angles are rounded to a multiple of angle_step, so a sprite that keeps its
+    orientation (like a wall while the camera is not turning) is rotated only once.
+    Scales should come from a small set of values (see ResolutionScaler), every
+    scale gets its own copies.
+    When the cached surfaces exceed the memory budget the least recently used
+    ones are evicted.
+    """
+    def __init__(self, angle_step=1.0, memory_budget=256 * 1024 * 1024):
+        self.angle_step = angle_step        # Angles are rounded to a multiple of this (degrees)
+        self.memory_budget = memory_budget  # Maximum size of cached surfaces in bytes
+        self.memory_used = 0
+        self.surfaces = OrderedDict()       # { (sprite, angle, scale): rotated sprite }, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, angle):
+        """Rounds an angle(in degrees) to the cache's angle step and wraps it to [0,360)"""
+        return (round(angle / self.angle_step) * self.angle_step) % 360
+
+    def rotate(self, sprite, angle, scale=1.0):
+        """Returns the sprite rotated by an angle(in degrees) and scaled, using a cached surface if possible"""
+        key = (sprite, self.quantize(angle), scale)
+        rotated = self.surfaces.get(key)
+        if rotated is not None:
+            self.surfaces.move_to_end(key)  # Mark as recently used
+            self.hits += 1
+            return rotated
+        self.misses += 1
+        if scale == 1.0:
+            rotated = pygame.transform.rotate(sprite, key[1])
+        else:
+            rotated = pygame.transform.rotozoom(sprite, key[1], scale)  # Smoothed, unlike rotate()
+        size = self.get_surface_size(rotated)
+        if size > self.memory_budget:  # Never cache something that does not fit at all
+            return rotated
+        self.surfaces[key] = rotated
+        self.memory_used += size
+        self.evict(self.memory_budget)
+        return rotated
+
+    def evict(self, memory_limit=0):
+        """Drops least recently used surfaces until the cache fits into memory_limit bytes"""
+        while self.memory_used > memory_limit and self.surfaces:
+            _, rotated = self.surfaces.popitem(last=False)
+            self.memory_used -= self.get_surface_size(rotated)
+
+    def clear(self):
+        """Drops all cached surfaces"""
+        self.evict(0)
+
+    @staticmethod
+    def get_surface_size(surface):
+        """Returns the approximate amount of memory taken by a surface in bytes"""
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
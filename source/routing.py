@@ -0,0 +1,232 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import heapq
+    import numpy
+    import sys
+    from collections import OrderedDict
+    from level import Tunnel
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+INFINITY = float('inf')
+
+
+class Router:
+    """
+    Finds shortest routes between junctions of a level
+
+    Junctions are the nodes of a graph and tunnels are its edges, weighted by their
+    length in grid cells. Routes are found with A*, guided by the Manhattan distance
+    and, after precompute_landmarks(), by distances to landmark junctions (ALT),
+    which prunes most of the search on big maps. Recent routes are cached.
+
+    Build the router once the level layout is final, or call rebuild() after changing it.
+    """
+    def __init__(self, level, cache_size=1024):
+        self.level = level
+        self.cache_size = cache_size  # How many recent routes are remembered
+        self.cache = OrderedDict()    # { (start index, goal index): (path, distance) }, least recently used first
+        self.coordinates = []         # [(x, y)] grid coordinates of every junction
+        self.neighbours = []          # [[(neighbour index, tunnel length)]] for every junction
+        self.landmarks = []           # [distances from a landmark to every junction]
+        self.rebuild()
+
+    def rebuild(self):
+        """Builds the graph from the level, dropping cached routes and landmarks"""
+        storage = self.level.storage
+        self.neighbours = [[] for _ in range(storage.junction_count)]
+        joined = storage.tunnel_orientations[:storage.tunnel_count] >= 0  # Skip tunnels that were never joined
+        ends = storage.tunnel_junctions[:storage.tunnel_count][joined]
+        coordinates = storage.junction_coordinates
+        self.coordinates = coordinates[:storage.junction_count].tolist()
+        lengths = numpy.abs(coordinates[ends[:, 0]] - coordinates[ends[:, 1]]).sum(axis=1)
+        for (index_from, index_to), length in zip(ends.tolist(), lengths.tolist()):
+            self.neighbours[index_from].append((index_to, length))
+            self.neighbours[index_to].append((index_from, length))
+        self.cache.clear()
+        self.landmarks = []
+
+    @staticmethod
+    def get_length(junction_from, junction_to):
+        """Returns the distance between two junctions in grid cells"""
+        return abs(junction_from.x - junction_to.x) + abs(junction_from.y - junction_to.y)
+
+    def get_distances(self, source):
+        """Returns distances in grid cells from a junction index to every junction (Dijkstra)"""
+        distances = [INFINITY] * len(self.neighbours)
+        distances[source] = 0
+        queue = [(0, source)]
+        while queue:
+            distance, current = heapq.heappop(queue)
+            if distance > distances[current]:
+                continue  # Outdated queue entry
+            for neighbour, length in self.neighbours[current]:
+                candidate = distance + length
+                if candidate < distances[neighbour]:
+                    distances[neighbour] = candidate
+                    heapq.heappush(queue, (candidate, neighbour))
+        return distances
+
+    def precompute_landmarks(self, count=8):
+        """Picks landmark junctions spread over the map and stores distances to them
+
+        Landmarks are chosen as far as possible from each other. Memory is count * junctions
+        numbers and every route search afterwards explores far fewer junctions.
+        """
+        self.landmarks = []
+        if not self.neighbours:
+            return
+        closest = [INFINITY] * len(self.neighbours)  # Distance to the closest landmark
+        landmark = 0
+        for _ in range(count):
+            distances = self.get_distances(landmark)
+            self.landmarks.append(distances)
+            closest = [min(old, new) for old, new in zip(closest, distances)]
+            reachable = [(distance, index) for index, distance in enumerate(closest) if distance < INFINITY]
+            farthest_distance, landmark = max(reachable)
+            if farthest_distance == 0:
+                break  # Every junction is a landmark already
+        self.cache.clear()
+
+    def get_heuristic(self, index, goal):
+        """Returns a lower bound of the distance between two junction indices"""
+        (x0, y0), (x1, y1) = self.coordinates[index], self.coordinates[goal]
+        estimate = abs(x0 - x1) + abs(y0 - y1)
+        for distances in self.landmarks:  # Triangle inequality
+            if distances[index] < INFINITY and distances[goal] < INFINITY:
+                estimate = max(estimate, abs(distances[goal] - distances[index]))
+        return estimate
+
+    def find_route(self, start, goal):
+        """Finds the shortest route between two junctions
+
+        Args:
+            start: Junction to start from
+            goal: Junction to get to
+
+        Returns:
+            path, distance: a list of junctions from start to goal and its length in grid cells,
+            or None, None if the goal cannot be reached
+        """
+        start_index = start.index
+        goal_index = goal.index
+        key = (start_index, goal_index)
+        if key in self.cache:
+            self.cache.move_to_end(key)  # Mark as recently used
+            path, distance = self.cache[key]
+        else:
+            path, distance = self.search(start_index, goal_index)
+            self.cache[key] = (path, distance)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        if path is None:
+            return None, None
+        return [self.level.junctions[index] for index in path], distance
+
+    def search(self, start, goal):
+        """A* search between two junction indices
+
+        Returns:
+            path, distance: junction indices from start to goal and the route length, None, None if unreachable
+        """
+        distances = {start: 0}
+        previous = {start: None}
+        queue = [(self.get_heuristic(start, goal), start)]
+        while queue:
+            _, current = heapq.heappop(queue)
+            if current == goal:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path[::-1], distances[goal]
+            distance = distances[current]
+            for neighbour, length in self.neighbours[current]:
+                candidate = distance + length
+                if candidate < distances.get(neighbour, INFINITY):
+                    distances[neighbour] = candidate
+                    previous[neighbour] = current
+                    heapq.heappush(queue, (candidate + self.get_heuristic(neighbour, goal), neighbour))
+        return None, None
+
+    def find_route_from(self, world_x, world_y, goal):
+        """Finds the shortest route from world coordinates to a junction
+
+        Works from inside a junction or a tunnel, in a tunnel both of its ends are tried
+
+        Returns:
+            path, distance: like find_route(), the distance includes the way to the first junction
+        """
+        grid_x, grid_y = self.level.world_to_grid(world_x, world_y)
+        element = self.level.cells.get((grid_x, grid_y))
+        if element is None:
+            return None, None
+        if not isinstance(element, Tunnel):
+            return self.find_route(element, goal)
+        best_path, best_distance = None, None
+        for junction in element.junctions:  # Try both ends of the tunnel
+            path, distance = self.find_route(junction, goal)
+            if path is None:
+                continue
+            distance += abs(junction.x - grid_x) + abs(junction.y - grid_y)
+            if best_distance is None or distance < best_distance:
+                best_path, best_distance = path, distance
+        return best_path, best_distance
+
+    def get_eta(self, world_x, world_y, goal, speed):
+        """Returns the estimated time to reach a junction in seconds
+
+        Args:
+            world_x, world_y: current position in world coordinates
+            goal: Junction to get to
+            speed: average speed in pixels per second
+
+        Returns:
+            Seconds, None if the goal cannot be reached, INFINITY if it is somewhere else and speed is not positive
+        """
+        path, distance = self.find_route_from(world_x, world_y, goal)
+        if path is None:
+            return None
+        if distance == 0:
+            return 0.0
+        if speed <= 0:
+            return INFINITY  # Standing still
+        return distance * self.level.grid_size / speed
+
+    def get_direction_hint(self, world_x, world_y, goal):
+        """Returns where to go next to reach a junction: 'up', 'down', 'left', 'right' or None
+
+        None means the goal is reached or cannot be reached
+        """
+        path, _ = self.find_route_from(world_x, world_y, goal)
+        if path is None:
+            return None
+        grid_x, grid_y = self.level.world_to_grid(world_x, world_y)
+        for junction in path:  # First junction on the route that is not where we are
+            if (junction.x, junction.y) != (grid_x, grid_y):
+                if junction.x > grid_x:
+                    return 'right'
+                if junction.x < grid_x:
+                    return 'left'
+                return 'down' if junction.y > grid_y else 'up'
+        return None
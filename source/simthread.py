@@ -0,0 +1,119 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import pymunk  # Need this for pymunk.Vec2d
+    import queue
+    import threading
+    import time  # Need this for time.perf_counter()
+    import sys
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class PhysicsThread(threading.Thread):
+    """
+    Runs World.update() on its own thread at a fixed rate
+
+    Once the thread is started, only the thread touches the physical simulation.
+    The main thread hands player actions over with hold() and post(), and reads
+    body transforms for drawing with apply_snapshot(). pymunk releases the GIL
+    while it steps the space, so rendering and physics overlap.
+
+    Snapshots are double-buffered: the thread fills the back buffer and swaps
+    it with the front buffer under a lock, the main thread only reads the front one.
+    """
+    def __init__(self, world, player=None, rate=150.0, max_lag=8):
+        super().__init__(name="physics", daemon=True)
+        self.world = world
+        self.player = player      # Player that receives the actions, None if nobody drives
+        self.step = 1.0 / rate    # Seconds simulated every tick
+        self.max_lag = max_lag    # Ticks the thread may fall behind before it stops catching up
+        self.held = ()            # Player methods called every tick, replaced as a whole by hold()
+        self.commands = queue.Queue()  # Player methods called once, on the next tick
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()   # Guards swapping and reading the snapshot buffers
+        self.front = []           # Published snapshot: [(x0, y0, angle0, x1, y1, angle1)] for every collidable
+        self.back = []            # Snapshot that is being written
+        self.front_time = None    # When the front snapshot was published (time.perf_counter())
+        self.ticks = 0            # Ticks simulated so far
+        world.physics.interpolation = False  # Render transforms come from snapshots instead
+
+    def hold(self, actions):
+        """Sets the player methods called every tick until the next hold(), e.g. ['accelerate', 'steer_left']"""
+        self.held = tuple(actions)
+
+    def post(self, action):
+        """Queues a player method that is called once, e.g. 'turn_right'"""
+        self.commands.put(action)
+
+    def stop(self):
+        """Stops the thread and waits for it to finish"""
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        next_tick = time.perf_counter()
+        while not self.stop_event.is_set():
+            self.tick()
+            next_tick += self.step
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self.stop_event.wait(delay)  # Sleep until the next tick or until stopped
+            elif delay < -self.step * self.max_lag:  # Too far behind, do not try to catch up
+                next_tick = time.perf_counter()
+
+    def tick(self):
+        """Applies player actions, simulates one step and publishes a snapshot"""
+        if self.player is not None:
+            while True:
+                try:
+                    action = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                getattr(self.player, action)()
+            for action in self.held:
+                getattr(self.player, action)()
+        collidables = self.world.physics.collidables
+        before = [(body.position.x, body.position.y, body.angle)
+                  for body in (collidable.body for collidable in collidables)]
+        self.world.update(self.step)
+        self.back[:] = [state + (collidable.body.position.x, collidable.body.position.y, collidable.body.angle)
+                        for state, collidable in zip(before, collidables)]
+        with self.lock:  # Publish
+            self.front, self.back = self.back, self.front
+            self.front_time = time.perf_counter()
+        self.ticks += 1
+
+    def apply_snapshot(self):
+        """Sets render transforms of collidables from the latest snapshot (called from the main thread)
+
+        Transforms are interpolated between the last two ticks by the time passed since the
+        snapshot was published, so the drawn state lags behind by at most one tick
+        """
+        with self.lock:
+            if self.front_time is None:
+                return
+            alpha = min((time.perf_counter() - self.front_time) / self.step, 1.0)
+            for collidable, (x0, y0, angle0, x1, y1, angle1) in zip(self.world.physics.collidables, self.front):
+                collidable.render_position = pymunk.Vec2d(x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha)
+                collidable.render_angle = angle0 + (angle1 - angle0) * alpha
@@ -0,0 +1,222 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import numpy
+    import sys
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+BODY_FIELDS = 9  # x, y, angle, velocity x, velocity y, angular velocity,
+                 # impulse x, impulse y, angular impulse not yet used by a physics step
+# Scalar fields of a snapshot, in the order they are packed
+VALUE_FIELDS = ('accumulator', 'alpha', 'step_count',
+                'movement_angle', 'steered_this_frame',
+                'camera_x', 'camera_y', 'camera_angle', 'camera_rotate_towards')
+FLEET_FIELDS = ('throttle', 'steering', 'movement_angles', 'autopilot', 'stuck_times')
+
+
+class Snapshot:
+    """
+    State of a running world packed into arrays
+
+    Only what changes while the game runs is stored: dynamic bodies and their pending
+    impulses, angles of the static pivots that alignment springs pull towards, the
+    fleet's controls and a few fields of the physics, the player and the camera. The
+    level and the walls are not stored, a snapshot can only be restored into the world
+    it was taken from (or a copy of it, like a forked process). Snapshots can be pickled.
+
+    Chipmunk keeps two things about touching bodies that pymunk does not expose, so they
+    can not be stored: the cached impulses of contacts and the bias velocities that push
+    overlapping bodies apart, which are only applied at the start of the next step.
+    Replaying the same input after a restore gives the same run while no dynamic body
+    touches anything. Once bodies touch walls or each other the replay starts off by a
+    fraction of a pixel (below 0.25 px with 5 AI cars). Collisions amplify that, so
+    after a few seconds a car can end up on a different side of another one.
+    """
+    __slots__ = ('tick', 'bodies', 'pivots', 'fleet', 'values')
+
+    def __init__(self, body_count, pivot_count, fleet_count):
+        self.tick = 0  # Physics steps simulated when the snapshot was taken
+        self.bodies = numpy.zeros((body_count, BODY_FIELDS))  # Row per dynamic collidable
+        self.pivots = numpy.zeros(pivot_count)                # Angles in radians
+        self.fleet = numpy.zeros((len(FLEET_FIELDS), fleet_count))
+        self.values = numpy.zeros(len(VALUE_FIELDS))
+
+    def __getstate__(self):
+        return self.tick, self.bodies, self.pivots, self.fleet, self.values
+
+    def __setstate__(self, state):
+        self.tick, self.bodies, self.pivots, self.fleet, self.values = state
+
+
+def get_pivots(world, player=None):
+    """Returns the static bodies that alignment springs of the player and the fleet pull towards"""
+    pivots = [] if player is None else [player.alignment_spring_pivot]
+    return pivots + world.fleet.pivots
+
+
+def capture(world, player=None, camera=None, snapshot=None):
+    """Takes a snapshot of a running world
+
+    Args:
+        world: World to take the snapshot of
+        player: Player in the world, None if there is none
+        camera: Camera that follows the player, None if there is none
+        snapshot: Snapshot to overwrite if it has the right size, a new one is made otherwise
+
+    Returns:
+        The Snapshot
+    """
+    bodies = [collidable.body for collidable in world.physics.collidables]
+    pivots = get_pivots(world, player)
+    fleet = world.fleet
+    if snapshot is None or snapshot.bodies.shape[0] != len(bodies) or len(snapshot.pivots) != len(pivots) \
+            or snapshot.fleet.shape[1] != fleet.count:
+        snapshot = Snapshot(len(bodies), len(pivots), fleet.count)
+    impulses = world.physics.impulses
+    if bodies:
+        rows = []
+        for body in bodies:
+            (impulse_x, impulse_y), angular_impulse = impulses.get(body, ((0.0, 0.0), 0.0))
+            rows.append((*body.position, body.angle, *body.velocity, body.angular_velocity,
+                         impulse_x, impulse_y, angular_impulse))
+        snapshot.bodies[:] = rows
+    snapshot.pivots[:] = [pivot.angle for pivot in pivots]
+    for row, name in enumerate(FLEET_FIELDS):
+        snapshot.fleet[row] = getattr(fleet, name)[:fleet.count]
+    physics = world.physics
+    values = [physics.accumulator, physics.alpha, physics.step_count]
+    values += [0.0, 0.0] if player is None else [player.movement_angle, player.steered_this_frame]
+    values += [0.0] * 4 if camera is None else [camera.x, camera.y, camera.angle, camera.rotate_towards]
+    snapshot.values[:] = values
+    snapshot.tick = physics.step_count
+    return snapshot
+
+
+def restore(snapshot, world, player=None, camera=None):
+    """Puts a world back into the state of a snapshot taken with capture()
+
+    Raises:
+        ValueError: If bodies or cars were added to or removed from the world since the snapshot
+    """
+    collidables = world.physics.collidables
+    pivots = get_pivots(world, player)
+    fleet = world.fleet
+    if snapshot.bodies.shape[0] != len(collidables) or len(snapshot.pivots) != len(pivots) \
+            or snapshot.fleet.shape[1] != fleet.count:
+        raise ValueError("(!) Error: the snapshot was taken from a world with different bodies")
+    space = world.physics.space
+    impulses = world.physics.impulses
+    impulses.clear()
+    for collidable, (x, y, angle, velocity_x, velocity_y, angular_velocity,
+                     impulse_x, impulse_y, angular_impulse) in zip(collidables, snapshot.bodies.tolist()):
+        body = collidable.body
+        body.position = x, y
+        body.angle = angle
+        body.velocity = velocity_x, velocity_y
+        body.angular_velocity = angular_velocity
+        body.force = 0, 0
+        body.torque = 0
+        if impulse_x or impulse_y or angular_impulse:  # Forces of a frame that was too short for a step
+            impulses[body] = ((impulse_x, impulse_y), angular_impulse)
+        space.reindex_shapes_for_body(body)  # Let collision detection know about the move
+        collidable.previous_position = None   # Do not interpolate from the current state
+        collidable.render_position = None
+        collidable.render_angle = None
+    for pivot, angle in zip(pivots, snapshot.pivots.tolist()):
+        pivot.angle = angle
+    for row, name in enumerate(FLEET_FIELDS):
+        getattr(fleet, name)[:fleet.count] = snapshot.fleet[row]
+    (accumulator, alpha, step_count, movement_angle, steered_this_frame,
+     camera_x, camera_y, camera_angle, camera_rotate_towards) = snapshot.values.tolist()
+    world.physics.accumulator = accumulator
+    world.physics.alpha = alpha
+    world.physics.step_count = int(step_count)
+    if player is not None:
+        player.movement_angle = movement_angle
+        player.steered_this_frame = bool(steered_this_frame)
+    if camera is not None:
+        camera.x, camera.y = camera_x, camera_y
+        camera.angle = camera_angle
+        camera.rotate_towards = camera_rotate_towards
+
+
+class SnapshotRing:
+    """
+    Fixed-size ring buffer of snapshots taken every few ticks, for rewinding
+
+    Call update() once per world update. Snapshot arrays are reused once the ring
+    is full, so keeping the ring costs no allocations while the game runs.
+    """
+    def __init__(self, world, player=None, camera=None, capacity=64, interval=15):
+        self.world = world
+        self.player = player
+        self.camera = camera
+        self.capacity = capacity  # Most snapshots kept, the oldest ones are overwritten
+        self.interval = interval  # Ticks between snapshots
+        self.slots = [None] * capacity  # Snapshots, reused once the ring is full
+        self.newest = -1          # Slot of the newest snapshot
+        self.count = 0            # Snapshots in the ring
+        self.ticks = 0            # Ticks since the last snapshot
+
+    def update(self):
+        """Counts a tick and takes a snapshot every interval ticks"""
+        self.ticks += 1
+        if self.ticks >= self.interval:
+            self.ticks = 0
+            self.save()
+
+    def save(self):
+        """Takes a snapshot right away"""
+        self.newest = (self.newest + 1) % self.capacity
+        self.slots[self.newest] = capture(self.world, self.player, self.camera, self.slots[self.newest])
+        self.count = min(self.count + 1, self.capacity)
+
+    def get(self, checkpoints=0):
+        """Returns a snapshot, 0 is the newest one, 1 the one before it and so on, None if there is none"""
+        if not 0 <= checkpoints < self.count:
+            return None
+        return self.slots[(self.newest - checkpoints) % self.capacity]
+
+    def rewind(self, checkpoints=0):
+        """Restores a snapshot and forgets the snapshots taken after it
+
+        Args:
+            checkpoints: 0 to go back to the newest snapshot, 1 to the one before it and so on
+
+        Returns:
+            True if the world was rewound, False if there are not that many snapshots
+        """
+        snapshot = self.get(checkpoints)
+        if snapshot is None:
+            return False
+        restore(snapshot, self.world, self.player, self.camera)
+        self.newest = (self.newest - checkpoints) % self.capacity
+        self.count -= checkpoints
+        self.ticks = 0
+        return True
+
+    def clear(self):
+        """Forgets all snapshots"""
+        self.newest = -1
+        self.count = 0
+        self.ticks = 0
@@ -0,0 +1,90 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import math  # Need this for math.floor()
+    import sys
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class SpatialGrid:
+    """
+    Uniform grid that finds objects inside a rectangle of the world
+
+    Objects are stored by the cell that contains their position, so a query
+    only looks at the cells that overlap the rectangle instead of every object.
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size  # Size of each cell in world coordinates
+        self.cells = {}             # { (cell_x, cell_y): [items] }
+        self.size = 0               # Number of items in the grid
+
+    def get_cell(self, world_x, world_y):
+        """Returns the cell that contains world coordinates"""
+        return int(math.floor(world_x / self.cell_size)), int(math.floor(world_y / self.cell_size))
+
+    def insert(self, item, world_x, world_y):
+        """Adds an item at world coordinates"""
+        self.cells.setdefault(self.get_cell(world_x, world_y), []).append(item)
+        self.size += 1
+
+    def remove(self, item, world_x, world_y):
+        """Removes an item that was inserted at world coordinates
+
+        Raises:
+            ValueError: If the item is not in the grid at these coordinates
+        """
+        cell = self.get_cell(world_x, world_y)
+        items = self.cells.get(cell)
+        if items is None or item not in items:
+            raise ValueError("(!) Error: removing an item that is not in the spatial grid")
+        items.remove(item)
+        if not items:
+            del self.cells[cell]
+        self.size -= 1
+
+    def query(self, left, top, right, bottom):
+        """Returns all items whose positions may be inside a rectangle (world coordinates)
+
+        The result includes every item in the cells touched by the rectangle,
+        so items slightly outside of it can be returned as well
+        """
+        cell_left, cell_top = self.get_cell(left, top)
+        cell_right, cell_bottom = self.get_cell(right, bottom)
+        found = []
+        if (cell_right - cell_left + 1) * (cell_bottom - cell_top + 1) > len(self.cells):
+            # The rectangle covers more cells than there are occupied ones, check those instead
+            for (cell_x, cell_y), items in self.cells.items():
+                if cell_left <= cell_x <= cell_right and cell_top <= cell_y <= cell_bottom:
+                    found.extend(items)
+            return found
+        for cell_x in range(cell_left, cell_right + 1):
+            for cell_y in range(cell_top, cell_bottom + 1):
+                items = self.cells.get((cell_x, cell_y))
+                if items:
+                    found.extend(items)
+        return found
+
+    def clear(self):
+        """Removes all items"""
+        self.cells = {}
+        self.size = 0
@@ -0,0 +1,154 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import pygame
+    import math  # Need this for math.floor()
+    import sys
+    from window import LAYER_STATIC
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+
+class StaticLayer:
+    """
+    Scenery that never moves, pre-rendered into large chunk surfaces
+
+    The world is split into square chunks of chunk_cells x chunk_cells grid cells.
+    Chunks tile the world exactly, a sprite that crosses the border of a chunk
+    is drawn into every chunk it touches. A chunk's surface is baked the first
+    time the chunk becomes visible and dropped once the camera moves far away
+    from it. The camera only rests at right angles, so every chunk also keeps
+    one rotated copy per such angle.
+
+    Empty parts of a chunk are marked with a colorkey and the chunk is RLE
+    accelerated, so drawing it costs about as much as drawing its sprites,
+    not its whole area. Sprites should therefore be either fully opaque or
+    fully transparent, partially transparent pixels are blended with the colorkey.
+    """
+    def __init__(self, grid_size, chunk_cells=2, keep_distance=1, colorkey=(255, 0, 255)):
+        self.chunk_size = grid_size * chunk_cells  # Size of a chunk in world coordinates
+        self.keep_distance = keep_distance  # Chunks this many chunks away from the view are kept baked
+        self.colorkey = colorkey            # Color of the empty parts of chunks
+        self.items = {}     # { (chunk_x, chunk_y): [(rotated sprite, world rect)] }
+        self.chunks = {}    # { (chunk_x, chunk_y): surface } baked chunks
+        self.variants = {}  # { (chunk_x, chunk_y, camera angle, scale): surface rotated by the camera angle }
+        self.rotated = {}   # { (sprite, angle): rotated sprite } shared by all items with the same look
+
+    def get_chunk(self, world_x, world_y):
+        """Returns the chunk that contains world coordinates"""
+        return int(math.floor(world_x / self.chunk_size)), int(math.floor(world_y / self.chunk_size))
+
+    def add(self, sprite, angle, world_x, world_y):
+        """Adds a sprite to the layer
+
+        Args:
+            sprite: Surface with the sprite
+            angle: degrees, counterclockwise like in pygame.transform.rotate()
+            world_x: world coordinates of the sprite's center
+            world_y: world coordinates of the sprite's center
+        """
+        rotated = self.rotated.get((sprite, angle))
+        if rotated is None:
+            rotated = self.rotated[(sprite, angle)] = pygame.transform.rotate(sprite, angle)
+        rect = rotated.get_rect(center=(world_x, world_y))
+        chunk_left, chunk_top = self.get_chunk(rect.left, rect.top)
+        chunk_right, chunk_bottom = self.get_chunk(rect.right - 1, rect.bottom - 1)
+        for chunk_x in range(chunk_left, chunk_right + 1):  # Add the sprite to every chunk it touches
+            for chunk_y in range(chunk_top, chunk_bottom + 1):
+                key = (chunk_x, chunk_y)
+                self.items.setdefault(key, []).append((rotated, rect))
+                self.drop(key)  # The chunk has to be baked again
+
+    def clear(self):
+        """Removes everything from the layer"""
+        self.items = {}
+        self.chunks = {}
+        self.variants = {}
+        self.rotated = {}
+
+    def drop(self, key):
+        """Frees the baked surfaces of a chunk"""
+        self.chunks.pop(key, None)
+        for variant in [variant for variant in self.variants if variant[:2] == key]:
+            del self.variants[variant]
+
+    @staticmethod
+    def can_render(camera):
+        """Returns true if the layer can be drawn for the camera's current angle (a right angle)"""
+        return camera.angle % 90 == 0
+
+    def bake(self, key):
+        """Renders all sprites of a chunk into one surface"""
+        surface = pygame.Surface((self.chunk_size, self.chunk_size))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        surface.fill(self.colorkey)
+        left = key[0] * self.chunk_size
+        top = key[1] * self.chunk_size
+        surface.blits([(rotated, rect.move(-left, -top)) for rotated, rect in self.items[key]])
+        surface.set_colorkey(self.colorkey, pygame.RLEACCEL)
+        return surface
+
+    def get_variant(self, key, camera_angle, scale=1.0):
+        """Returns a chunk's surface rotated by a right camera angle and scaled, baking it if needed"""
+        camera_angle = int(camera_angle) % 360
+        variant = self.variants.get(key + (camera_angle, scale))
+        if variant is None:
+            if key not in self.chunks:
+                self.chunks[key] = self.bake(key)
+            chunk = self.chunks[key]
+            if scale != 1.0:  # Not smoothed, that would blend the colorkey into the edges
+                size = int(round(self.chunk_size * scale))
+                chunk = pygame.transform.scale(chunk, (size, size))
+            variant = pygame.transform.rotate(chunk, camera_angle)  # Cheap at right angles
+            variant.set_colorkey(self.colorkey, pygame.RLEACCEL)
+            self.variants[key + (camera_angle, scale)] = variant
+        return variant
+
+    def render(self, window):
+        """Queues every visible chunk to be drawn to the window"""
+        camera = window.camera
+        left, top, right, bottom = camera.get_view_bounds()
+        chunk_left, chunk_top = self.get_chunk(left, top)
+        chunk_right, chunk_bottom = self.get_chunk(right, bottom)
+        # Place all chunks relative to one rounded point so that they tile without seams
+        origin_x, origin_y = camera.world_to_viewport((0, 0))
+        matrix = camera.get_rotation_matrix()
+        for chunk_x in range(chunk_left, chunk_right + 1):
+            for chunk_y in range(chunk_top, chunk_bottom + 1):
+                key = (chunk_x, chunk_y)
+                if key not in self.items:
+                    continue
+                surface = self.get_variant(key, camera.angle, window.render_scale)
+                center_x = (chunk_x + 0.5) * self.chunk_size
+                center_y = (chunk_y + 0.5) * self.chunk_size
+                x = origin_x + int(round(center_x * matrix[0][0] + center_y * matrix[1][0]))
+                y = origin_y + int(round(center_x * matrix[0][1] + center_y * matrix[1][1]))
+                window.draw_at_viewport(surface, x, y, LAYER_STATIC, dynamic=False)
+        self.evict(chunk_left - self.keep_distance, chunk_top - self.keep_distance,
+                   chunk_right + self.keep_distance, chunk_bottom + self.keep_distance)
+
+    def evict(self, chunk_left, chunk_top, chunk_right, chunk_bottom):
+        """Frees the baked surfaces of all chunks outside of a range of chunks"""
+        for key in list(self.chunks.keys()):
+            if not (chunk_left <= key[0] <= chunk_right and chunk_top <= key[1] <= chunk_bottom):
+                self.drop(key)
@@ -0,0 +1,63 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import os  # Need this for os.chdir()
+    import sys
+    import unittest
+    from level import Level
+    from player import Player
+    from utils import angle_difference
+    from world import World
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+TIME_DELTA = 1 / 75.0
+working_dir = None  # Working directory before the tests, images are loaded relative to this file's directory
+
+
+def setUpModule():
+    global working_dir
+    working_dir = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tearDownModule():
+    os.chdir(working_dir)
+
+
+class PlayerTest(unittest.TestCase):
+    def test_car_keeps_heading_after_spawning_down(self):
+        level = Level()
+        level.generate_maze(6, 6, seed=0)
+        self.assertEqual(level.entry_direction, 'down')
+        world = World(level=level)
+        world.build_from_level()
+        player = Player()
+        player.place_in_world(world)
+        self.assertEqual(player.movement_angle, 180)
+        for frame in range(75):
+            world.update(TIME_DELTA)
+        self.assertLess(abs(angle_difference(player.get_car_angle(), 180)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import math  # Need this for math.hypot()
+    import os  # Need this for os.chdir()
+    import sys
+    import unittest
+    from player import Player
+    from snapshot import capture, restore, SnapshotRing
+    from world import World
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+TIME_DELTA = 1 / 75.0
+working_dir = None  # Working directory before the tests, images are loaded relative to this file's directory
+
+
+def setUpModule():
+    global working_dir
+    working_dir = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tearDownModule():
+    os.chdir(working_dir)
+
+
+def create_world(cars, frames=200):
+    """Returns a world with the test level, a player and AI cars, driven for a number of frames"""
+    world = World(physics_step=1 / 150.0)
+    world.build_from_level()
+    player = Player()
+    player.place_in_world(world)
+    world.fleet.spawn_in_level(cars, seed=1)
+    drive(world, player, frames)
+    return world, player
+
+
+def drive(world, player, frames):
+    """Plays the same input every time and returns positions of every dynamic body after every frame"""
+    positions = []
+    for frame in range(frames):
+        player.accelerate()
+        if frame == 50:
+            player.turn_right()
+        world.update(TIME_DELTA)
+        positions.append([tuple(collidable.body.position) for collidable in world.physics.collidables])
+    return positions
+
+
+def get_drift(first, second):
+    """Returns the largest distance between the same body in two runs from drive()"""
+    return max(math.hypot(a[0] - b[0], a[1] - b[1])
+               for frame_a, frame_b in zip(first, second) for a, b in zip(frame_a, frame_b))
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_replay_without_contacts_is_exact(self):
+        world, player = create_world(0, frames=100)  # The car reaches the first wall after about 200 frames
+        snapshot = capture(world, player)
+        first = drive(world, player, 90)
+        restore(snapshot, world, player)
+        self.assertLess(get_drift(first, drive(world, player, 90)), 1e-6)
+
+    def test_replay_with_contacts_stays_close(self):
+        # Chipmunk's contact caches are not restored, see Snapshot
+        world, player = create_world(5)
+        snapshot = capture(world, player)
+        first = drive(world, player, 60)
+        restore(snapshot, world, player)
+        self.assertLess(get_drift(first, drive(world, player, 60)), 0.5)
+
+    def test_pending_impulses_are_restored(self):
+        world, player = create_world(0)
+        player.accelerate()
+        world.update(world.physics.fixed_step / 4)  # Too short for a step, the force stays pending
+        pending = dict(world.physics.impulses)
+        snapshot = capture(world, player)
+        drive(world, player, 10)
+        restore(snapshot, world, player)
+        self.assertTrue(pending)
+        self.assertEqual(world.physics.impulses, pending)
+
+    def test_restore_into_different_world_fails(self):
+        world, player = create_world(0)
+        snapshot = capture(world, player)
+        world.fleet.spawn_in_level(1, seed=2)
+        with self.assertRaises(ValueError):
+            restore(snapshot, world, player)
+
+    def test_ring_rewinds_and_forgets_newer_snapshots(self):
+        world, player = create_world(0)
+        ring = SnapshotRing(world, player, capacity=4, interval=2)
+        for frame in range(20):
+            world.update(TIME_DELTA)
+            ring.update()
+        self.assertEqual(ring.count, 4)
+        tick = ring.get(2).tick
+        self.assertTrue(ring.rewind(2))
+        self.assertEqual(world.physics.step_count, tick)
+        self.assertEqual(ring.count, 2)
+        self.assertFalse(ring.rewind(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
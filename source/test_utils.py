@@ -0,0 +1,47 @@
+"""
+    This file is part of space-delivery-game.
+
+    space-delivery-game is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    space-delivery-game is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with space-delivery-game.  If not, see <http://www.gnu.org/licenses/>.
+
+
+    Copyright(C) 2017 Oleksii Davydenko
+"""
+
+try:
+    import numpy
+    import sys
+    import unittest
+    from utils import angle_difference, angle_differences
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
+# Pairs of angles, including differences of exactly 180 degrees both ways and angles outside [0,360)
+ANGLE_PAIRS = [(240, 350), (350, 240), (40, 350), (350, 40), (0, 180), (180, 0), (90, 270), (270, 90),
+               (-90, 90), (450, -90), (359.7, 0.2), (0, 0), (-180, 180)]
+
+
+class AngleDifferencesTest(unittest.TestCase):
+    def test_arrays_match_angle_difference(self):
+        angles1, angles2 = numpy.array(ANGLE_PAIRS).T
+        expected = [angle_difference(angle1, angle2) for angle1, angle2 in ANGLE_PAIRS]
+        self.assertEqual(angle_differences(angles1, angles2).tolist(), expected)
+
+    def test_scalars_match_angle_difference(self):
+        for angle1, angle2 in ANGLE_PAIRS:
+            self.assertEqual(angle_differences(angle1, angle2), angle_difference(angle1, angle2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,13 @@
     Copyright(C) 2017 Oleksii Davydenko
 """
 
+try:
+    import numpy
+    import sys
+except ImportError as exc:
+    print("(!) Could not load module {}, exiting...".format(exc))
+    sys.exit(-1)
+
 
 def angle_difference(angle1, angle2):
     """Calculates difference between two angles, eliminating wrapping issues
@@ -39,9 +46,25 @@ def angle_difference(angle1, angle2):
     return difference
 
 
+def angle_differences(angles1, angles2):
+    """Calculates differences between two arrays of angles, like angle_difference() for every pair
+
+    Args:
+        angles1: array of degrees, or a single angle
+        angles2: array of degrees, or a single angle
+
+    Returns:
+        Array of differences [-180,180]
+    """
+    difference = numpy.trunc(angles2) % 360 - numpy.trunc(angles1) % 360  # Normalize angles
+    difference = numpy.where(difference < -180, difference + 360, difference)  # Wrap
+    return numpy.where(difference > 180, difference - 360, difference)
+
+
 def test():
     """TODO: expand this into actual unit tests"""
     print(angle_difference(240, 350))  # 110
     print(angle_difference(350, 240))  # -110
     print(angle_difference(40, 350))  # -50
-    print(angle_difference(350, 40))  # 50
\ No newline at end of file
+    print(angle_difference(350, 40))  # 50
+    print(angle_differences(numpy.array([240, 350, 40, 350]), numpy.array([350, 240, 350, 40])))  # [110 -110 -50 50]
\ No newline at end of file
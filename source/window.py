@@ -20,41 +20,204 @@
 
 try:
     import pygame
+    import pymunk  # Need this for body types
     import math  # Need this for math.degrees()
+    import numpy
     import sys
     from camera import Camera
+    from rotationcache import RotationCache
+    from profiler import FrameProfiler
 except ImportError as exc:
     print("(!) Could not load module {}, exiting...".format(exc))
     sys.exit(-1)
 
 
+# Layers of the render queue, lower layers are drawn first
+LAYER_STATIC = 0   # Scenery that never moves (walls)
+LAYER_DYNAMIC = 1  # Things that move on their own (cars)
+LAYER_DEBUG = 2    # Debug markers
+
+
 class Window():
     """
     Class that handles window creation, resizing and rendering of various objects
+
+    Sprites are not drawn right away but queued and drawn in one batch by flush()
+
+    Everything is drawn onto a canvas. At a render scale of 1 the canvas is the screen,
+    at lower scales it is a smaller offscreen surface that present() stretches over the
+    screen. Viewport coordinates are always in window pixels, draw_at_viewport() scales
+    them, sprites must already be scaled (see RotationCache and StaticLayer).
+
+    With compositing on, world objects drawn between begin_world() and end_world() while
+    the camera turns are drawn unrotated into a square buffer that covers the view at any
+    angle, and the buffer is rotated onto the canvas once. Sprites are then only rotated by
+    their own angle and walls come from pre-rendered chunks. At right camera angles the
+    buffer is skipped and the world is drawn straight onto the canvas.
     """
-    def __init__(self, width=800, height=600, caption="untitled", flags=0, icon=None):
+    def __init__(self, width=800, height=600, caption="untitled", flags=0, icon=None,
+                 rotation_step=1.0, rotation_budget=256 * 1024 * 1024, smooth_scaling=False, compositing=False):
         self.resolution = [width, height]
         self.fullscreen = False
         self.screen = pygame.display.set_mode(self.resolution, flags)
         pygame.display.set_caption(caption)
         self.rect = self.screen.get_rect()
+        self.canvas = self.screen       # Surface that everything is drawn onto
+        self.render_scale = 1.0         # Size of the canvas relative to the screen
+        self.smooth_scaling = smooth_scaling  # Upscale with smoothscale() instead of scale(), slower
+        self.canvas_changed = False     # Something was drawn onto a scaled canvas since the last present()
+        self.target = self.canvas       # Surface that flush() draws onto, the canvas or the compositing buffer
+        self.compositing = compositing  # Draw the world unrotated and rotate it once while the camera turns
+        self.composite_buffer = None    # Unrotated world, reused between frames
+        self.composite_angle = 0        # Camera angle while the world is drawn into the buffer
+        self.background = (0, 0, 0)     # Color of the last fill(), the buffer is filled with it too
         if icon is not None: pygame.display.set_icon(icon)
         self.camera = Camera(width, height)
+        self.rotation_cache = RotationCache(angle_step=rotation_step,       # Rotated sprites that are
+                                            memory_budget=rotation_budget)  # reused between frames
+        self.profiler = FrameProfiler(enabled=False)  # Replaced by the game's profiler to time rendering
+        self.render_queue = []          # [(layer, sprite, position, dynamic)] to be drawn by flush()
+        self.dirty_rects = []           # Screen areas that changed this frame, besides static scenery
+        self.previous_dirty_rects = []  # Same for the previous frame, those need to be erased
+        self.full_redraw = True         # Push the whole screen to the display on the next update
+        self.last_view = None           # Camera position and angle during the last update
+        self.debug_dot = pygame.Surface((10, 10), pygame.SRCALPHA)  # Marks the centers of collidables
+        pygame.draw.circle(self.debug_dot, pygame.Color(255, 255, 255, 255), (5, 5), 5, 0)
 
     def fill(self, color):
         """Fills window with color"""
-        self.screen.fill(color)
+        self.canvas.fill(color)
+        self.canvas_changed = True
+        self.background = color
+
+    def set_render_scale(self, scale):
+        """Renders at a fraction of the window resolution from now on, e.g. 0.5 for half width and height"""
+        if scale == self.render_scale:
+            return
+        self.render_scale = scale
+        if scale == 1.0:
+            self.canvas = self.screen
+        else:
+            self.canvas = pygame.Surface((int(self.resolution[0] * scale), int(self.resolution[1] * scale)))
+            if pygame.display.get_surface() is not None:
+                self.canvas = self.canvas.convert()
+        self.target = self.canvas
+        self.composite_buffer = None
+        self.full_redraw = True
+
+    def present(self):
+        """Draws the queued sprites and stretches the canvas over the screen if it is smaller"""
+        self.flush()
+        if self.canvas is self.screen or not self.canvas_changed:
+            return
+        self.canvas_changed = False
+        with self.profiler.section('upscale'):
+            if self.smooth_scaling:
+                pygame.transform.smoothscale(self.canvas, self.rect.size, self.screen)
+            else:
+                pygame.transform.scale(self.canvas, self.rect.size, self.screen)
 
     def draw(self, sprite, world_coordinates):
         """Draws a sprite onto the screen"""
         x, y = self.camera.world_to_viewport(world_coordinates)  # Convert coordinates to viewport
-        x -= sprite.get_width()/2   # Align coordinates
-        y -= sprite.get_height()/2  # so the sprite's pivot is centered
-        self.screen.blit(sprite, (x,y))
+        self.draw_at_viewport(sprite, x, y)
+
+    def draw_at_viewport(self, sprite, x, y, layer=LAYER_DYNAMIC, dynamic=True):
+        """Queues a sprite to be drawn centered at viewport coordinates
+
+        Args:
+            sprite: Surface to draw
+            x, y: viewport coordinates of the sprite's center
+            layer: sprites on lower layers are drawn first
+            dynamic: False if the sprite is in the same place every frame while the camera stands still
+        """
+        x = x * self.render_scale - sprite.get_width()/2   # Align coordinates
+        y = y * self.render_scale - sprite.get_height()/2  # so the sprite's pivot is centered
+        self.render_queue.append((layer, sprite, (x, y), dynamic))
+
+    def flush(self):
+        """Draws every queued sprite with a single Surface.blits() call
+
+        Sprites are sorted by layer and then by texture, so identical sprites are blitted one after another
+        """
+        if not self.render_queue:
+            return
+        with self.profiler.section('blit'):
+            self.render_queue.sort(key=lambda item: (item[0], id(item[1])))
+            rects = self.target.blits([(sprite, position) for _, sprite, position, _ in self.render_queue])
+            self.canvas_changed = True
+            if self.target is self.canvas:  # Rects in the buffer are not where they end up on the screen
+                for (_, _, _, dynamic), rect in zip(self.render_queue, rects):
+                    if dynamic:
+                        self.dirty_rects.append(rect)
+            self.render_queue = []
+
+    def begin_world(self):
+        """Starts drawing world objects, into the compositing buffer if the camera is turning
+
+        Until end_world() the camera looks at the world unrotated and its view is the buffer
+        """
+        self.flush()  # Whatever was queued before goes straight onto the canvas
+        if not self.compositing or self.camera.angle % 90 == 0:
+            return
+        if self.composite_buffer is None:  # Big enough for the view at any angle
+            side = int(math.ceil(math.hypot(*self.resolution) / 16)) * 16
+            self.composite_buffer = pygame.Surface((int(side * self.render_scale), int(side * self.render_scale)))
+            if pygame.display.get_surface() is not None:
+                self.composite_buffer = self.composite_buffer.convert()
+        width, height = self.get_composite_size(self.camera.angle)
+        # Only the part of the buffer that covers the view at this angle is drawn and rotated
+        self.target = self.composite_buffer.subsurface((0, 0, int(width * self.render_scale),
+                                                        int(height * self.render_scale)))
+        self.target.fill(self.background)
+        self.composite_angle = self.camera.angle
+        self.camera.angle = 0
+        self.camera.view_width, self.camera.view_height = width, height
+
+    def get_composite_size(self, angle):
+        """Returns the size of the unrotated area that covers the view rotated by an angle, in window pixels
+
+        Sizes are multiples of 16, which keeps the center on a whole pixel at every scale of ResolutionScaler
+        """
+        cos = abs(math.cos(math.radians(angle)))
+        sin = abs(math.sin(math.radians(angle)))
+        width, height = self.resolution
+        return (int(math.ceil((width * cos + height * sin) / 16)) * 16,
+                int(math.ceil((width * sin + height * cos) / 16)) * 16)
+
+    def end_world(self):
+        """Finishes drawing world objects, rotating the compositing buffer onto the canvas if it was used"""
+        self.flush()
+        if self.target is self.canvas:
+            return
+        buffer, self.target = self.target, self.canvas
+        self.camera.angle = self.composite_angle
+        self.camera.view_width, self.camera.view_height = self.resolution
+        with self.profiler.section('composite'):
+            rotated = pygame.transform.rotate(buffer, self.camera.angle)  # Once per frame
+            self.canvas.blit(rotated, rotated.get_rect(center=self.canvas.get_rect().center))
+
+    def mark_dirty(self, rect):
+        """Makes sure a screen area will be pushed to the display on the next update"""
+        self.dirty_rects.append(pygame.Rect(rect))
 
     def update(self):
-        # pygame.display.flip()
-        pygame.display.update(self.rect)
+        """Draws the queued sprites and pushes the changed parts of the screen to the display
+
+        While the camera does not move only the areas of dynamic sprites (this frame's and last
+        frame's) are pushed, since the static scenery is drawn at the same place.
+        A scaled canvas covers the whole screen, so then the whole screen is pushed
+        """
+        self.present()
+        view = (self.camera.x, self.camera.y, self.camera.angle)
+        if self.full_redraw or view != self.last_view or self.canvas is not self.screen:
+            pygame.display.update(self.rect)
+        else:
+            pygame.display.update(self.dirty_rects + self.previous_dirty_rects)
+        self.previous_dirty_rects = self.dirty_rects
+        self.dirty_rects = []
+        self.last_view = view
+        self.full_redraw = False
 
     @staticmethod
     def get_resolution():
@@ -68,6 +231,9 @@ class Window():
         elif self.fullscreen:
             self.screen = pygame.display.set_mode(self.resolution)
             self.fullscreen = False
+        if self.render_scale == 1.0:
+            self.canvas = self.screen
+        self.full_redraw = True
 
     def change_resolution(self, width, height):
         """Changes resolution of the window"""
@@ -76,12 +242,35 @@ class Window():
     def draw_collidable(self, collidable):
         """Draws a collidable"""
         # Only draw collidables that are close to the viewport
-        if self.camera.near_viewport(collidable.get_position()):
-            angle_degrees = math.degrees(-collidable.body.angle)                # Get sprite's direction
-            angle_degrees += self.camera.angle                                  # Apply camera rotation
-            sprite = pygame.transform.rotate(collidable.sprite, angle_degrees)  # Rotate the sprite
-            self.draw(sprite, collidable.get_position())                        # Draw the sprite
-            # DEBUG: draw center of the collidable
-            coord = self.camera.world_to_viewport(collidable.get_position())
-            pygame.draw.circle(self.screen, pygame.Color(255, 255, 255, 255),
-                               coord, 5, 0)
+        coord = self.camera.world_to_viewport(collidable.get_render_position())
+        if self.camera.viewport_near_view(*coord):
+            self.draw_collidable_at_viewport(collidable, coord)
+
+    def draw_collidables(self, collidables, positions=None):
+        """Draws many collidables, converting their coordinates to the viewport in one go
+
+        Args:
+            collidables: a sequence of collidables
+            positions: array (N, 2) of their world coordinates, taken from the collidables if None
+        """
+        if not len(collidables):
+            return
+        if positions is None:
+            positions = [tuple(collidable.get_render_position()) for collidable in collidables]
+        coordinates, visible = self.camera.world_to_viewport_batch(positions)
+        for index in numpy.flatnonzero(visible):  # Only draw collidables that are close to the viewport
+            self.draw_collidable_at_viewport(collidables[index], tuple(coordinates[index]))
+
+    def draw_collidable_at_viewport(self, collidable, coord):
+        """Draws a collidable centered at viewport coordinates"""
+        angle_degrees = math.degrees(-collidable.get_render_angle())           # Get sprite's direction
+        angle_degrees += self.camera.angle                                     # Apply camera rotation
+        with self.profiler.section('rotation'):
+            sprite = self.rotation_cache.rotate(collidable.sprite, angle_degrees,  # Rotate the sprite
+                                                self.render_scale)
+        dynamic = collidable.body.body_type != pymunk.Body.STATIC
+        layer = LAYER_DYNAMIC if dynamic else LAYER_STATIC
+        self.draw_at_viewport(sprite, coord[0], coord[1], layer, dynamic)     # Draw the sprite
+        # DEBUG: draw center of the collidable
+        self.draw_at_viewport(self.rotation_cache.rotate(self.debug_dot, 0, self.render_scale),
+                              coord[0], coord[1], LAYER_DEBUG, dynamic)
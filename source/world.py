@@ -19,10 +19,16 @@
 """
 
 try:
+    import math  # Need this for math.degrees()
+    import numpy
     import sys
     from physics import Physics
     from collidable import Collidable
     from level import Level
+    from spatialindex import SpatialGrid
+    from staticlayer import StaticLayer
+    from routing import Router
+    from fleet import Fleet
 except ImportError as exc:
     print("(!) Could not load module {}, exiting...".format(exc))
     sys.exit(-1)
@@ -32,38 +38,194 @@ class World:
     """
     Class that includes all objects in a level and handles interaction between them
     """
-    def __init__(self):
-        self.physics = Physics()  # Add a physics handler
-        self.level = Level()      # Add a level layout
-        self.level.generate_test_level()  # DEBUG: create a test level
-        self.walls = []
+    def __init__(self, physics_step=None, max_substeps=8, stream_radius=None, stream_hysteresis=2,
+                 stream_chunk_cells=4, level=None):
+        self.physics = Physics(fixed_step=physics_step, max_substeps=max_substeps)  # Add a physics handler
+        if level is None:
+            level = Level()
+            level.generate_test_level()  # DEBUG: create a test level
+        self.level = level        # Add a level layout
+        self.walls = []        # Walls that are drawn, one per grid cell
+        self.wall_positions = numpy.zeros((0, 2))  # World coordinates of self.walls, row per wall
+        self.wall_shapes = {}  # { chunk: [merged wall shapes] } in the physical simulation, chunk None if not streaming
+        self.wall_size = None  # Thickness and length of a single wall
+        # Streaming: only walls of chunks near dynamic collidables are in the physical simulation
+        self.stream_radius = stream_radius  # Grid cells around a collidable that have walls, None to add all walls
+        self.stream_hysteresis = stream_hysteresis  # Extra grid cells before walls are removed again
+        self.stream_chunk_cells = stream_chunk_cells  # Walls are added and removed in chunks of this many cells
+        self.stream_chunks = {}  # { chunk: wall table } for every chunk that has walls, see Level.export_wall_table()
+        self.wall_index = SpatialGrid(self.level.grid_size)  # Finds indices of walls that are near the camera
+        self.static_layer = StaticLayer(self.level.grid_size)  # Walls pre-rendered in chunks
+        self.router = None  # Finds delivery routes, created once the level is built
+        self.fleet = Fleet(self)  # AI cars
 
     def update(self, time_delta):
         """Updates the whole world by one frame"""
+        self.fleet.update(time_delta)  # Drive AI cars
+        if self.stream_radius is not None:
+            self.stream_walls()  # Add walls near the cars, remove walls far from them
         self.physics.update(time_delta)  # Update physics
 
     def render(self, window):
         """Renders all world objects to the window"""
-        for wall in self.walls:
-            window.draw_collidable(wall)
+        window.draw_collidables(self.fleet.cars)  # Draw AI cars
+        if self.static_layer.can_render(window.camera):  # Camera is not turning, draw pre-rendered chunks
+            with window.profiler.section('chunks'):
+                self.static_layer.render(window)
+            return
+        with window.profiler.section('culling'):
+            indices = self.wall_index.query(*window.camera.get_view_bounds())  # Only walls near the view
+        window.draw_collidables([self.walls[index] for index in indices], self.wall_positions[indices])
 
     def add_collidable(self, collidable):
         """Adds a collidable to the physical simulation"""
         self.physics.add_collidable(collidable)
 
-    def build_from_level(self):
-        """Builds the world's physical objects from level layout"""
-        wall_positions = self.level.export_walls()
-        for wall_position in wall_positions:
-            if wall_position[2] is "Vertical":
-                angle = 0
-            elif wall_position[2] is "Horizontal":
-                angle = 90
-            wall = Collidable(image_dir="../resources/images/side_wall.png",
-                              x=wall_position[0],
-                              y=wall_position[1],
-                              angle=angle,
-                              body_type='static',
-                              shape_type='box')
-            self.walls.append(wall)            # Save wall
-            self.add_collidable(wall)  # Add wall to physical simulation
+    def remove_collidable(self, collidable):
+        """Removes a collidable from the physical simulation"""
+        self.physics.remove_collidable(collidable)
+
+    def clear(self):
+        """Removes all walls and AI cars from the world and releases their sprites"""
+        self.fleet.clear()
+        for wall in self.walls:
+            wall.release()
+        self.walls = []
+        self.wall_positions = numpy.zeros((0, 2))
+        for chunk in list(self.wall_shapes.keys()):
+            self.unload_chunk(chunk)
+        self.stream_chunks = {}
+        self.wall_index.clear()
+        self.static_layer.clear()
+
+    def build_from_level(self, wall_table=None, progress=None):
+        """Builds the world's physical objects from level layout
+
+        Every wall gets its own sprite, but the physical simulation only gets
+        one shape per row of collinear walls
+
+        Args:
+            wall_table: walls from Level.export_wall_table() if they were exported already,
+                e.g. on a loading thread, None to export them now
+            progress: function called with the fraction of walls created so far, e.g. to draw a loading screen
+        """
+        self.add_walls(self.create_walls(wall_table, progress))
+
+    def create_walls(self, wall_table=None, progress=None, progress_interval=2000):
+        """First half of build_from_level(): creates sprites and bodies of the walls and the router
+
+        Nothing is added to the physical simulation, so this can run on a loading thread
+        while no other thread uses the world or the asset cache
+
+        Args:
+            wall_table: like in build_from_level()
+            progress: like in build_from_level()
+            progress_interval: walls created between calls to progress
+
+        Returns:
+            The wall table for add_walls(), see Level.export_wall_table()
+        """
+        self.router = Router(self.level)  # The layout is final now
+        if wall_table is None:
+            wall_table = self.level.export_wall_table()
+        coordinates, orientations = wall_table  # May be views of a level file, decoded a block at a time
+        for start in range(0, len(orientations), progress_interval):
+            if progress is not None:
+                progress(start / len(orientations))
+            end = start + progress_interval
+            for x, y, orientation in self.level.decode_wall_table(coordinates[start:end], orientations[start:end]):
+                if orientation == "Vertical":
+                    angle = 0
+                elif orientation == "Horizontal":
+                    angle = 90
+                wall = Collidable(image_dir="../resources/images/side_wall.png",
+                                  x=x,
+                                  y=y,
+                                  angle=angle,
+                                  body_type='static',
+                                  shape_type='box')
+                self.wall_index.insert(len(self.walls), *wall.get_position())  # Make the wall visible to the camera
+                self.static_layer.add(wall.sprite, math.degrees(-wall.body.angle), *wall.get_position())
+                self.walls.append(wall)            # Save wall
+        if self.walls:
+            self.wall_positions = numpy.array([tuple(wall.get_position()) for wall in self.walls])
+            self.wall_size = self.walls[0].sprite.get_size()  # Wall sprites are vertical
+        if progress is not None:
+            progress(1.0)
+        return wall_table
+
+    def add_walls(self, wall_table):
+        """Second half of build_from_level(): adds the walls from create_walls() to the physical simulation"""
+        if not self.walls:
+            return
+        if self.stream_radius is None:
+            self.stream_chunks = {None: wall_table}
+            self.load_chunk(None)  # Add merged walls to physical simulation
+            return
+        # Sort walls into chunks, they are decoded and added when a car comes close
+        coordinates, orientations = wall_table
+        cells = numpy.floor(coordinates / self.level.grid_size).astype(numpy.int64)  # Like get_stream_cell()
+        chunks = cells // self.stream_chunk_cells
+        order = numpy.lexsort((chunks[:, 1], chunks[:, 0]))
+        chunks = chunks[order]
+        starts = numpy.flatnonzero(numpy.any(chunks[1:] != chunks[:-1], axis=1)) + 1
+        for indices, chunk in zip(numpy.split(order, starts), chunks[numpy.concatenate(([0], starts))].tolist()):
+            self.stream_chunks[tuple(chunk)] = coordinates[indices], orientations[indices]
+        self.stream_walls()
+
+    def get_stream_cell(self, world_x, world_y):
+        """Returns the grid cell of world coordinates, rounding down also below zero
+
+        Level.world_to_grid() truncates, which would put cells -1 and 0 into the same chunk
+        """
+        grid_size = self.level.grid_size
+        return int(math.floor(world_x / grid_size)), int(math.floor(world_y / grid_size))
+
+    def get_stream_chunk(self, grid_x, grid_y):
+        """Returns the streaming chunk that contains a grid cell"""
+        return grid_x // self.stream_chunk_cells, grid_y // self.stream_chunk_cells
+
+    def get_chunk_distance(self, chunk, grid_x, grid_y):
+        """Returns the distance in grid cells from a grid cell to the nearest cell of a chunk"""
+        left = chunk[0] * self.stream_chunk_cells
+        top = chunk[1] * self.stream_chunk_cells
+        right = left + self.stream_chunk_cells - 1
+        bottom = top + self.stream_chunk_cells - 1
+        return max(left - grid_x, grid_x - right, top - grid_y, grid_y - bottom, 0)
+
+    def load_chunk(self, chunk):
+        """Adds the merged walls of a chunk to the physical simulation"""
+        thickness, length = self.wall_size
+        shapes = []
+        wall_positions = self.level.decode_wall_table(*self.stream_chunks[chunk])
+        for start_x, start_y, end_x, end_y, orientation in self.level.merge_walls(wall_positions):
+            shapes.append(self.physics.add_wall_segment((start_x, start_y), (end_x, end_y),
+                                                        length, thickness, orientation))
+        self.wall_shapes[chunk] = shapes
+
+    def unload_chunk(self, chunk):
+        """Removes the walls of a chunk from the physical simulation"""
+        for shape in self.wall_shapes.pop(chunk):
+            self.physics.space.remove(shape)
+
+    def stream_walls(self):
+        """Makes sure that walls near dynamic collidables are simulated and walls far from them are not
+
+        Walls are added within stream_radius grid cells of a collidable, but only removed once
+        they are stream_hysteresis cells further away, so a car driving along a chunk border
+        does not keep adding and removing the same walls
+        """
+        cells = [self.get_stream_cell(*collidable.get_position()) for collidable in self.physics.collidables]
+        for chunk in list(self.wall_shapes.keys()):  # Unload chunks that are far from everything
+            if all(self.get_chunk_distance(chunk, grid_x, grid_y) > self.stream_radius + self.stream_hysteresis
+                   for grid_x, grid_y in cells):
+                self.unload_chunk(chunk)
+        for grid_x, grid_y in cells:  # Load chunks that are close to something
+            chunk_left, chunk_top = self.get_stream_chunk(grid_x - self.stream_radius, grid_y - self.stream_radius)
+            chunk_right, chunk_bottom = self.get_stream_chunk(grid_x + self.stream_radius,
+                                                              grid_y + self.stream_radius)
+            for chunk_x in range(chunk_left, chunk_right + 1):
+                for chunk_y in range(chunk_top, chunk_bottom + 1):
+                    chunk = (chunk_x, chunk_y)
+                    if chunk in self.stream_chunks and chunk not in self.wall_shapes:
+                        self.load_chunk(chunk)